@@ -6,16 +6,31 @@ from discord.ext import commands
 
 from cog_overseer import Overseer
 from cog_tracker import Tracker
+from core.expiry import Expiry
+from core.profiles import client_options
+from core.sharding import Shard
 
 
 if __name__ == "__main__":
     load_dotenv()
     DISCORD_TOKEN = os.getenv("DISCORD_TOKEN")
     STEAM_TOKEN = os.getenv("STEAM_TOKEN")
+    shard = Shard.parse(os.getenv("SHARD_IDS"), os.getenv("SHARD_COUNT"))
+    options = client_options(os.getenv("CLIENT_PROFILE"))
 
-    bot = commands.Bot(command_prefix=("~", "?"), help_command=None)
+    if shard.is_sharded:
+        bot = commands.AutoShardedBot(command_prefix=("~", "?"), help_command=None,
+                                      shard_ids=shard.shard_ids,
+                                      shard_count=shard.shard_count, **options)
+    else:
+        bot = commands.Bot(command_prefix=("~", "?"), help_command=None, **options)
 
-    bot.add_cog(Overseer(bot))
-    bot.add_cog(Tracker(bot, STEAM_TOKEN))
+    expiry = Expiry(bot, shard.path("expiry", shard.shard_ids[0]))
+    bot.add_cog(Overseer(bot, expiry))
+    use_poller = os.getenv("STEAM_POLLER", "").lower() in ("1", "true", "process")
+    steam_options = {"record": os.getenv("STEAM_RECORD"),
+                     "replay": os.getenv("STEAM_REPLAY"),
+                     "speed": float(os.getenv("STEAM_REPLAY_SPEED", "1"))}
+    bot.add_cog(Tracker(bot, STEAM_TOKEN, expiry, shard, use_poller, steam_options))
     with open("data/console.log", "a") as sys.stderr:
         bot.run(DISCORD_TOKEN)
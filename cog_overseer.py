@@ -1,31 +1,46 @@
-from asyncio import sleep
 from datetime import datetime, timezone, timedelta
 
-from discord.errors import NotFound
-from discord.ext import commands
+from discord import ApplicationContext
+from discord.ext import tasks, commands
 
 from core.message_constructor import MessageConstructor as MC
+from core.watchdog import Watchdog
 
 
 class Overseer(commands.Cog):
     """Overseer Cog"""
 
-    def __init__(self, bot):
+    def __init__(self, bot, expiry):
         self.bot = bot
         self.tzinfo = timezone(timedelta(hours=3))
+        self.watchdog = Watchdog()
+        self.expiry = expiry
 
-    async def respond(self, ctx, **kvargs):
-        reply = await ctx.message.reply(**kvargs)
-        await sleep(15)
-        try:
-            await reply.delete()
-        except NotFound:
-            pass
+    @commands.Cog.listener()
+    async def on_ready(self):
+        self.watchdog.start(self.bot.loop)
+        if not self.expirer.is_running():
+            self.expirer.start()
+
+    def cog_unload(self):
+        self.watchdog.stop()
+        self.expirer.cancel()
+
+    @tasks.loop(seconds=1)
+    async def expirer(self):
         try:
-            await ctx.message.delete()
-        except NotFound:
+            await self.expiry.tick()
+        except:
             pass
 
+    async def respond(self, ctx, **kvargs):
+        if isinstance(ctx, ApplicationContext):
+            await ctx.respond(ephemeral=True, **kvargs)
+            return
+        reply = await ctx.message.reply(**kvargs)
+        self.expiry.add(reply, 15)
+        self.expiry.add(ctx.message, 15)
+
     @commands.Cog.listener()
     async def on_command_error(self, ctx, error):
         if isinstance(error, commands.CommandInvokeError):
@@ -39,12 +54,36 @@ class Overseer(commands.Cog):
             message_body = MC.error("Missing arguments.")
             await self.respond(ctx, **message_body)
 
+    @commands.Cog.listener()
+    async def on_application_command_error(self, ctx, error):
+        i = str(error).find("CommandInputError:")
+        if i != -1:
+            message_body = MC.error(str(error)[i + 18:])
+            await self.respond(ctx, **message_body)
+        else:
+            raise error
+
     @commands.Cog.listener()
     async def on_command(self, ctx):
+        self.log_command(ctx, ctx.args[2:])
+
+    @commands.Cog.listener()
+    async def on_application_command(self, ctx):
+        self.log_command(ctx, [str(x["value"]) for x in ctx.selected_options or []])
+
+    def log_command(self, ctx, params):
         time = datetime.now(self.tzinfo).strftime("%Y-%m-%d-%H:%M:%S")
-        guild = str(ctx.guild.id)
+        guild = str(ctx.guild.id) if ctx.guild else "DM"
         author = f"{ctx.author.name}#{ctx.author.discriminator}"
         command = ctx.command.qualified_name
-        params = ", ".join(ctx.args[2:])
+        params = ", ".join(params)
         with open("data/commands.log", "a") as f:
             f.write(f"{time} {guild} {author} {command} {params}\n")
+
+    @commands.command(name="stalls")
+    @commands.is_owner()
+    async def stalls(self, ctx):
+        """Display worst event loop stalls"""
+
+        message_body = MC.stalls(self.watchdog.lag, self.watchdog.report())
+        await self.respond(ctx, **message_body)
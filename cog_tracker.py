@@ -1,36 +1,51 @@
-from asyncio import sleep
+from asyncio import gather, sleep, Semaphore
+import os
+import sys
+from time import monotonic
 import orjson
 
-from core.steam_api import SteamAPI
-from core.utils import CommandInputError
-from discord import utils, Game
+from core.steam_api import SteamAPI, SteamUnavailable
+from core.utils import BlockView, EditView, CommandInputError, mask_reasons, parse_date, parse_dialog, today, \
+    unescape_characters
+from discord import utils, ApplicationContext, Attachment, File, Game
+from discord.commands import Option, slash_command
 from discord.errors import NotFound
 from discord.ext import tasks, commands
 
 from core.database import Database
 from core.message_constructor import MessageConstructor as MC
+from core.poller import Poller
+from core.sharding import Shard
+from core.transfer import read_rows, write_rows
 
 
 class Tracker(commands.Cog):
     """Steam accounts tracking Cog"""
 
-    def __init__(self, bot, steam_key):
+    def __init__(self, bot, steam_key, expiry, shard=None, use_poller=False, steam_options=None):
         self.bot = bot
-        self.api = SteamAPI(steam_key)
-
-        self.database = Database(self.bot)
-
+        self.expiry = expiry
+        self.api = SteamAPI(steam_key, **(steam_options or {}))
+        self.shard = shard or Shard()
+        self.jobs = set()
+
+        self.database = Database(self.bot, self.shard)
+        self.poller = None
+        if use_poller:
+            self.poller = Poller(steam_key, steam_options)
+            self.database.poller = self.poller
+
+        self.closed = set()
         self.current_guild_tracker = -1
         self.current_guild_updater = -2
         self.guilds = list(self.database.accountants.keys())
-        try:
-            with open("data/permissions.json", "rb") as f:
-                self.permissions = orjson.loads(f.read())
-        except FileNotFoundError:
-            self.permissions = {guild_id: {} for guild_id in self.guilds}
+        self.permissions = {guild_id: {} for guild_id in self.guilds}
+        found = self.load_permissions()
+        if not found:
             self.save_permissions()
 
         self.status = 1
+        self.is_warm = False
 
     async def set_status_busy(self):
         self.status += 1
@@ -41,10 +56,7 @@ class Tracker(commands.Cog):
         self.status -= 1
         if self.status:
             return
-        try:
-            count = self.api.get_player_count()
-        except:
-            count = "?"
+        count = await self.bot.loop.run_in_executor(None, self.get_player_count)
         suffix = " | {}🧍".format(count)
         game = Game("?help | ✅" + suffix)
         await self.bot.change_presence(activity=game)
@@ -52,24 +64,102 @@ class Tracker(commands.Cog):
     async def update_status(self):
         pass
 
+    def get_player_count(self):
+        if not self.shard.is_sharded:
+            try:
+                return self.api.get_player_count()
+            except:
+                return "?"
+        if self.shard.is_primary:
+            try:
+                count = self.api.get_player_count()
+            except:
+                count = None
+            with open("data/presence.json", "wb") as f:
+                f.write(orjson.dumps({"count": count}))
+            return "?" if count is None else count
+        try:
+            with open("data/presence.json", "rb") as f:
+                count = orjson.loads(f.read())["count"]
+        except (FileNotFoundError, orjson.JSONDecodeError, KeyError):
+            count = None
+        return "?" if count is None else count
+
+    def load_permissions(self):
+        paths = [f"data/{x}" for x in os.listdir("data")
+                 if x.startswith("permissions") and x.endswith(".json")]
+        for path in sorted(paths, key=os.path.getmtime):
+            with open(path, "rb") as f:
+                permissions = orjson.loads(f.read())
+            self.permissions.update({k: v for k, v in permissions.items()
+                                     if self.shard.owns(k)})
+        return bool(paths)
 
     def save_permissions(self):
-        with open("data/permissions.json", "wb") as f:
-            f.write(orjson.dumps(self.permissions))
+        partitions = {shard_id: {} for shard_id in self.shard.shard_ids}
+        for guild_id, guild_permissions in self.permissions.items():
+            if self.shard.owns(guild_id):
+                partitions[self.shard.of(guild_id)][guild_id] = guild_permissions
+        for shard_id, permissions in partitions.items():
+            with open(self.shard.path("permissions", shard_id), "wb") as f:
+                f.write(orjson.dumps(permissions))
+
+    async def warm_up(self, concurrency=4):
+        start = monotonic()
+        semaphore = Semaphore(concurrency)
+        totals = [0, 0, 0]
+
+        async def warm_up_guild(guild_id):
+            async with semaphore:
+                try:
+                    valid, missing = await self.database.warm_up(guild_id)
+                except Exception as e:
+                    print(f"Warm-up failed for {guild_id}: {e!r}", file=sys.stderr, flush=True)
+                    valid, missing = 0, 0
+            totals[0] += 1
+            totals[1] += valid
+            totals[2] += missing
+            print("Warm-up {}/{} guilds: {} valid, {} missing cards, {:.1f}s".format(
+                totals[0], len(self.guilds), totals[1], totals[2], monotonic() - start),
+                file=sys.stderr, flush=True)
+        await gather(*[warm_up_guild(guild_id) for guild_id in list(self.guilds)])
+        self.is_warm = True
 
     @commands.Cog.listener()
     async def on_ready(self):
+        if not self.is_warm:
+            await self.set_status_busy()
+            await self.warm_up()
+            await self.set_status_done()
+        if self.poller and self.poller.process.pid is None:
+            self.poller.start()
+            for guild_id in self.guilds:
+                for steam_id in self.database.get_ids(guild_id):
+                    self.poller.track(guild_id, steam_id,
+                                      self.database.state["guilds"][guild_id]["data"][steam_id])
+            self.receiver.start()
         self.tracker.start()
         self.updater.start()
+        self.verifier.start()
+        self.retrier.start()
+        self.digester.start()
+        self.prober.start()
         self.saver.start()
         self.backuper.start()
         await self.set_status_done()
 
     def cog_unload(self):
         self.tracker.cancel()
+        self.verifier.cancel()
+        self.retrier.cancel()
+        self.digester.cancel()
+        self.prober.cancel()
         self.updater.cancel()
         self.saver.cancel()
         self.backuper.cancel()
+        if self.poller:
+            self.receiver.cancel()
+            self.poller.stop()
 
     @tasks.loop(seconds=30)
     async def tracker(self):
@@ -79,9 +169,13 @@ class Tracker(commands.Cog):
                 self.current_guild_tracker = (
                     self.current_guild_tracker + 1) % l
                 guild_id = self.guilds[self.current_guild_tracker]
-                steam_ids = self.database.get_ids(guild_id)
-                response = self.api.get_summaries(steam_ids)
-                await self.database.compare_records(guild_id, response)
+                if self.poller or self.api.breaker.is_open:
+                    await self.database.repair_missing(guild_id)
+                else:
+                    steam_ids = self.database.get_ids(guild_id)
+                    response = await self.bot.loop.run_in_executor(
+                        None, self.api.get_summaries, steam_ids)
+                    await self.database.compare_records(guild_id, response)
         except:
             pass
         try:
@@ -89,6 +183,123 @@ class Tracker(commands.Cog):
         except:
             pass
 
+    @tasks.loop(seconds=10)
+    async def retrier(self):
+        try:
+            await self.database.retry_waiting()
+        except:
+            pass
+
+    @tasks.loop(seconds=30)
+    async def digester(self):
+        try:
+            await self.database.flush_digests()
+        except:
+            pass
+
+    @commands.Cog.listener()
+    async def on_interaction(self, interaction):
+        dialog = parse_dialog((interaction.data or {}).get("custom_id", ""))
+        if dialog is None:
+            return
+        kind, guild_id, steam_id, author_id, mask, action = dialog
+        if interaction.user.id != author_id or str(interaction.guild_id) != guild_id:
+            return
+        if not self.database.check_guild(guild_id) or interaction.message.id in self.closed:
+            return
+        if isinstance(action, int):
+            mask ^= 1 << action
+            if kind == "b":
+                view = BlockView(self.database, guild_id, steam_id, author_id, mask)
+            else:
+                view = EditView(self.database, guild_id, steam_id, author_id, kind == "f", mask)
+            await interaction.response.edit_message(view=view)
+            view.stop()
+            return
+        self.closed.add(interaction.message.id)
+        self.bot.loop.call_later(60, self.closed.discard, interaction.message.id)
+        await interaction.response.defer()
+        try:
+            await interaction.delete_original_message()
+        except NotFound:
+            pass
+        if action == "cancel":
+            return
+        embed = interaction.message.embeds[0]
+        level = {"b": 2, "e": 4 if embed.fields else 3, "f": 4}[kind]
+        if await self.member_level(interaction.guild, interaction.user) < level:
+            message_body = MC.error(f"You do not have LVL{level} permissions.")
+            await interaction.followup.send(ephemeral=True, **message_body)
+            return
+        if kind == "b":
+            await self.confirm_block(interaction.user, guild_id, steam_id, mask, embed)
+        elif self.database.check_record(guild_id, steam_id):
+            await self.confirm_edit(interaction.user, guild_id, steam_id, kind, mask, embed)
+
+    async def confirm_block(self, user, guild_id, steam_id, mask, embed):
+        if self.database.check_record(guild_id, steam_id):
+            item = self.database.get_record(guild_id, steam_id)
+            changes = {"reasons": mask_reasons(mask),
+                       "encounters": item["encounters"] + 1,
+                       "last_date": today()}
+            await self.database.update_record(guild_id, steam_id, changes)
+        else:
+            name = unescape_characters(embed.title)
+            item = {"message": 0,
+                    "name": name,
+                    "old_names": (name, ),
+                    "initiator": f"{user.name}#{user.discriminator}",
+                    "encounters": 1,
+                    "date": today(),
+                    "last_date": today(),
+                    "reasons": mask_reasons(mask),
+                    "url": embed.url,
+                    "avatar": embed.thumbnail.url}
+            await self.database.add_record(guild_id, steam_id, item)
+
+    async def confirm_edit(self, user, guild_id, steam_id, kind, mask, embed):
+        if mask:
+            changes = {"reasons": mask_reasons(mask)}
+            for field in embed.fields:
+                if field.name == "encounters":
+                    changes[field.name] = int(field.value)
+                elif field.name == "date":
+                    changes[field.name] = parse_date(field.value)
+                elif field.name == "initiator":
+                    changes[field.name] = field.value
+            await self.database.update_record(guild_id, steam_id, changes)
+        elif kind == "f":
+            await self.database.delete_record(guild_id, steam_id, user)
+
+    @commands.Cog.listener()
+    async def on_guild_channel_update(self, before, after):
+        self.database.retry_now(str(after.guild.id))
+
+    @commands.Cog.listener()
+    async def on_guild_role_update(self, before, after):
+        self.database.retry_now(str(after.guild.id))
+
+    @commands.Cog.listener()
+    async def on_member_update(self, before, after):
+        if after.id == self.bot.user.id and before.roles != after.roles:
+            self.database.retry_now(str(after.guild.id))
+
+    @tasks.loop(seconds=30)
+    async def prober(self):
+        if self.api.breaker.is_open:
+            await self.bot.loop.run_in_executor(None, self.api.probe)
+
+    @tasks.loop(seconds=1)
+    async def receiver(self):
+        for guild_id, response in self.poller.drain():
+            try:
+                changes = {k: v for k, v in response.items()
+                           if self.database.check_record(guild_id, k)
+                           and self.database.check_changed(guild_id, k, v)}
+                await self.database.apply_changes(guild_id, changes)
+            except:
+                pass
+
     @tracker.after_loop
     async def exit_tracker(self):
         self.database.save_state()
@@ -114,6 +325,13 @@ class Tracker(commands.Cog):
         except:
             pass
 
+    @tasks.loop(seconds=5)
+    async def verifier(self):
+        try:
+            await self.database.verify_pending()
+        except:
+            pass
+
     @tasks.loop(minutes=1)
     async def saver(self):
         self.database.save_state()
@@ -122,28 +340,91 @@ class Tracker(commands.Cog):
     async def backuper(self):
         self.database.backup_state()
 
+    async def send(self, ctx, **kvargs):
+        if isinstance(ctx, ApplicationContext):
+            return await ctx.respond(ephemeral=True, **kvargs)
+        return await ctx.message.reply(**kvargs)
+
     async def respond(self, ctx, timer=15, **kvargs):
-        reply = await ctx.message.reply(**kvargs)
-        await sleep(timer)
+        reply = await self.send(ctx, **kvargs)
+        if not isinstance(ctx, ApplicationContext):
+            self.expiry.add(reply, timer)
+            self.expiry.add(ctx.message, timer)
+
+    async def send_view(self, ctx, timer=30, **kvargs):
+        if isinstance(ctx, ApplicationContext):
+            reply = await ctx.respond(ephemeral=True, **kvargs)
+        else:
+            reply = await ctx.send(**kvargs)
+            self.expiry.add(reply, timer)
+            self.expiry.add(ctx.message, timer)
+        kvargs["view"].stop()
+
+    def get_id(self, guild_id, user):
         try:
-            await reply.delete()
-        except NotFound:
-            pass
+            return self.api.get_id(user), False
+        except SteamUnavailable:
+            steam_id = self.database.find_id(guild_id, user)
+            if not steam_id:
+                error_arg = "Steam is unavailable. Try again later."
+                raise CommandInputError(error_arg)
+            return steam_id, True
+
+    async def resolve_ids(self, profiles, guild_id=None):
+        resolved = {profile: self.api.parse_id(profile) for profile in profiles}
+        semaphore = Semaphore(8)
+
+        async def resolve(profile):
+            async with semaphore:
+                try:
+                    resolved[profile] = await self.bot.loop.run_in_executor(
+                        None, self.api.get_id, profile)
+                except SteamUnavailable:
+                    resolved[profile] = None
+                    if guild_id:
+                        resolved[profile] = self.database.find_id(guild_id, profile)
+                except:
+                    resolved[profile] = None
+        await gather(*[resolve(profile) for profile, steam_id in resolved.items()
+                       if steam_id is None])
+        return resolved
+
+    async def post_cards(self, progress, guild_id, steam_ids, header, pace=1.5):
+        await self.set_status_busy()
+        for i, steam_id in enumerate(steam_ids, 1):
+            try:
+                await self.database.get_message(guild_id, steam_id)
+            except ValueError:
+                pass
+            if i % 10 == 0 or i == len(steam_ids):
+                message_body = MC.basic(f"{header} Posting cards: {i}/{len(steam_ids)}")
+                try:
+                    await progress.edit(**message_body)
+                except NotFound:
+                    pass
+            await sleep(pace)
         try:
-            await ctx.message.delete()
-        except NotFound:
+            await self.set_status_done()
+        except:
             pass
 
     async def get_level(self, ctx):
-        guild_id = str(ctx.guild.id)
-        if await self.bot.is_owner(ctx.author):
+        return await self.member_level(ctx.guild, ctx.author)
+
+    async def member_level(self, guild, author):
+        if await self.bot.is_owner(author):
             return 5
-        if ctx.guild.owner_id == ctx.author.id:
+        if guild is None:
+            return 0
+        guild_id = str(guild.id)
+        if guild.owner_id == author.id:
             return 5
         if not self.database.check_guild(guild_id):
             return 0
+        if not hasattr(author, "roles"):
+            author = await guild.fetch_member(author.id)
         member_level = 0
-        for role in ctx.author.roles:
+        for role in author.roles:
             role_level = self.permissions[guild_id].get(str(role.id), 0)
             member_level = max(role_level, member_level)
         return member_level
@@ -156,27 +437,88 @@ class Tracker(commands.Cog):
 
     @commands.command(name="check")
     @commands.guild_only()
-    async def check(self, ctx, user):
-        """Check if user is blocked"""
+    async def check(self, ctx, user, *users):
+        """Check if users are blocked"""
 
         await self.level_checker(1, ctx)
         guild_id = str(ctx.guild.id)
         if not self.database.check_guild(guild_id):
             raise CommandInputError("Missing guild.")
-        steam_id = self.api.get_id(user)
+        if users:
+            return await self.check_many(ctx, guild_id, (user, ) + users)
+        steam_id, stale = await self.bot.loop.run_in_executor(
+            None, self.get_id, guild_id, user)
         if not steam_id:
             raise CommandInputError("Invalid profile.")
         try:
-            message_url = await self.database.get_message(guild_id, steam_id)
+            message_url = self.database.get_url(guild_id, steam_id)
         except ValueError:
             message_body = MC.basic("User is not tracked.")
-            await self.respond(ctx, **message_body)
         else:
             if not message_url:
                 error_arg = "User is tracked. Could not resolve message."
                 raise CommandInputError(error_arg)
             message_body = MC.check(message_url)
-            await self.respond(ctx, **message_body)
+        if stale:
+            MC.mark_stale(message_body)
+        await self.respond(ctx, **message_body)
+
+    async def check_many(self, ctx, guild_id, profiles):
+        profiles = list(dict.fromkeys(profiles))
+        if len(profiles) > 20:
+            raise CommandInputError("Up to 20 profiles can be checked at once.")
+        resolved = {profile: self.api.parse_id(profile) for profile in profiles}
+        unknown = [x for x in set(resolved.values())
+                   if x and not self.database.check_record(guild_id, x)]
+
+        async def get_summaries():
+            if not unknown:
+                return {}
+            try:
+                return await self.bot.loop.run_in_executor(
+                    None, self.api.get_summaries, unknown)
+            except:
+                return {}
+        vanity = [profile for profile, steam_id in resolved.items() if not steam_id]
+        summaries, vanity = await gather(get_summaries(),
+                                         self.resolve_ids(vanity, guild_id))
+        resolved.update(vanity)
+        results = []
+        for profile in profiles:
+            steam_id = resolved[profile]
+            if steam_id in summaries and summaries[steam_id] is None:
+                steam_id = None
+            if not steam_id:
+                results.append((profile, "invalid", None))
+            elif not self.database.check_record(guild_id, steam_id):
+                results.append((profile, "untracked", None))
+            else:
+                try:
+                    message_url = self.database.get_url(guild_id, steam_id)
+                except ValueError:
+                    results.append((profile, "untracked", None))
+                else:
+                    results.append((profile, "tracked", message_url))
+        message_body = MC.check_many(results)
+        if self.api.breaker.is_open:
+            MC.mark_stale(message_body)
+        await self.respond(ctx, timer=30, **message_body)
+
+    @commands.command(name="history")
+    @commands.guild_only()
+    async def history(self, ctx, user):
+        """Display name history"""
+
+        await self.level_checker(1, ctx)
+        guild_id = str(ctx.guild.id)
+        if not self.database.check_guild(guild_id):
+            raise CommandInputError("Missing guild.")
+        steam_id, _ = await self.bot.loop.run_in_executor(
+            None, self.get_id, guild_id, user)
+        if not steam_id or not self.database.names.check(steam_id):
+            raise CommandInputError("No name history.")
+        message_body = MC.history(steam_id, self.database.names.get(steam_id))
+        await self.respond(ctx, timer=30, **message_body)
 
     @commands.command(name="block")
     @commands.guild_only()
@@ -187,23 +529,27 @@ class Tracker(commands.Cog):
         guild_id = str(ctx.guild.id)
         if not self.database.check_guild(guild_id):
             raise CommandInputError("Missing guild.")
-        steam_id = self.api.get_id(user)
+        steam_id, stale = await self.bot.loop.run_in_executor(
+            None, self.get_id, guild_id, user)
         if not steam_id:
             raise CommandInputError("Invalid profile.")
-        item = self.api.get_summaries([steam_id, ])[steam_id]
+        try:
+            summaries = await self.bot.loop.run_in_executor(
+                None, self.api.get_summaries, [steam_id, ])
+            item = summaries[steam_id]
+        except SteamUnavailable:
+            if not self.database.check_record(guild_id, steam_id):
+                error_arg = "Steam is unavailable. Try again later."
+                raise CommandInputError(error_arg)
+            item = self.database.get_record(guild_id, steam_id)
+            stale = True
+        if not item:
+            raise CommandInputError("Invalid profile.")
         pass_in = [self.database, guild_id, steam_id, ctx, item]
         message_body = MC.block(*pass_in)
-        reply = await ctx.send(**message_body)
-        await message_body["view"].set_reply(reply)
-        await sleep(30)
-        try:
-            await reply.delete()
-        except NotFound:
-            pass
-        try:
-            await ctx.message.delete()
-        except NotFound:
-            pass
+        if stale:
+            MC.mark_stale(message_body)
+        await self.send_view(ctx, **message_body)
 
     @commands.command(name="edit")
     @commands.guild_only()
@@ -217,7 +563,8 @@ class Tracker(commands.Cog):
         guild_id = str(ctx.guild.id)
         if not self.database.check_guild(guild_id):
             raise CommandInputError("Missing guild.")
-        steam_id = self.api.get_id(user)
+        steam_id, _ = await self.bot.loop.run_in_executor(
+            None, self.get_id, guild_id, user)
         if not self.database.check_record(guild_id, steam_id):
             raise CommandInputError("Missing record.")
         if not steam_id:
@@ -235,19 +582,15 @@ class Tracker(commands.Cog):
                     raise CommandInputError(
                         "Encounters parameter should be an integer.")
                 args[key] = int(args[key])
+            if key == "date":
+                try:
+                    args[key] = parse_date(args[key])
+                except ValueError:
+                    raise CommandInputError(
+                        "Date parameter should be in dd/mm/yyyy format.")
         pass_in = [self.database, guild_id, steam_id, ctx, f, args]
         message_body = MC.edit(*pass_in)
-        reply = await ctx.send(**message_body)
-        await message_body["view"].set_reply(reply)
-        await sleep(30)
-        try:
-            await reply.delete()
-        except NotFound:
-            pass
-        try:
-            await ctx.message.delete()
-        except NotFound:
-            pass
+        await self.send_view(ctx, **message_body)
 
     @commands.command(name="restore")
     @commands.guild_only()
@@ -262,12 +605,148 @@ class Tracker(commands.Cog):
             await self.database.check_messages(guild_id)
             message_body = MC.basic("Done!")
             await self.respond(ctx, **message_body)
+        except CommandInputError:
+            raise
         except:
             pass
+        finally:
+            try:
+                await self.set_status_done()
+            except:
+                pass
+
+    @commands.command(name="import")
+    @commands.guild_only()
+    async def import_records(self, ctx):
+        """Import records from attached file"""
+
+        if not ctx.message.attachments:
+            raise CommandInputError("Attach a .csv or .json file.")
+        await self.import_attachment(ctx, ctx.message.attachments[0])
+
+    async def import_attachment(self, ctx, attachment):
+        await self.level_checker(5, ctx)
+        guild_id = str(ctx.guild.id)
+        if not self.database.check_guild(guild_id):
+            raise CommandInputError("Missing guild.")
+        rows = read_rows(attachment.filename, await attachment.read())
+        resolved = await self.resolve_ids([row["profile"] for row in rows])
+        steam_ids = list({x for x in resolved.values() if x})
+        summaries = {}
+        if steam_ids:
+            try:
+                summaries = await self.bot.loop.run_in_executor(
+                    None, self.api.get_summaries, steam_ids)
+            except SteamUnavailable:
+                error_arg = "Steam is unavailable. Try again later."
+                raise CommandInputError(error_arg)
+        date = today()
+        initiator = f"{ctx.author.name}#{ctx.author.discriminator}"
+        items = {}
+        invalid = 0
+        for row in rows:
+            steam_id = resolved[row["profile"]]
+            summary = summaries.get(steam_id)
+            if summary is None:
+                invalid += 1
+                continue
+            items[steam_id] = {"message": 0,
+                               "name": summary["name"],
+                               "old_names": (summary["name"], ),
+                               "initiator": row.get("initiator", initiator),
+                               "encounters": row.get("encounters", 1),
+                               "date": row.get("date", date),
+                               "last_date": row.get("last_date", row.get("date", date)),
+                               "reasons": tuple(row["reasons"]),
+                               "url": summary["url"],
+                               "avatar": summary["avatar"]}
+        added = await self.database.add_records(guild_id, items)
+        header = "Imported {}, skipped {} tracked and {} invalid.".format(
+            len(added), len(items) - len(added), invalid)
+        progress = await self.send(ctx, **MC.basic(header))
+        if added:
+            job = self.bot.loop.create_task(
+                self.post_cards(progress, guild_id, added, header))
+            self.jobs.add(job)
+            job.add_done_callback(self.jobs.discard)
+
+    @commands.command(name="export")
+    @commands.guild_only()
+    async def export_records(self, ctx, fmt="csv"):
+        """Export records to file"""
+
+        await self.level_checker(5, ctx)
+        guild_id = str(ctx.guild.id)
+        if not self.database.check_guild(guild_id):
+            raise CommandInputError("Missing guild.")
+        fmt = fmt.lower()
+        if fmt not in ["csv", "json"]:
+            raise CommandInputError("Format should be csv or json.")
+        records = self.database.state["guilds"][guild_id]["data"].items()
+        buffer = write_rows(fmt, records)
+        await self.send(ctx, file=File(buffer, filename=f"{guild_id}.{fmt}"))
+
+    @commands.command(name="unblocked")
+    @commands.guild_only()
+    async def unblocked(self, ctx, page="1"):
+        """Page through deleted records"""
+
+        await self.level_checker(5, ctx)
+        guild_id = str(ctx.guild.id)
+        if not self.database.check_guild(guild_id):
+            raise CommandInputError("Missing guild.")
+        if not page.isnumeric() or int(page) < 1:
+            raise CommandInputError("Page should be a positive integer.")
+        pages = (self.database.archive.count(guild_id) - 1) // 10 + 1
+        entries = self.database.archive.page(guild_id, int(page))
+        message_body = MC.unblocked(entries, int(page), pages)
+        await self.respond(ctx, timer=60, **message_body)
+
+    @commands.command(name="recover")
+    @commands.guild_only()
+    async def recover(self, ctx, number):
+        """Restore deleted record"""
+
+        await self.level_checker(5, ctx)
+        guild_id = str(ctx.guild.id)
+        if not self.database.check_guild(guild_id):
+            raise CommandInputError("Missing guild.")
+        if not number.isnumeric():
+            raise CommandInputError("Entry number should be an integer.")
         try:
-            await self.set_status_done()
-        except:
-            pass
+            entry = self.database.archive.get(guild_id, int(number))
+        except ValueError:
+            raise CommandInputError("Missing entry.")
+        item = entry["item"]
+        item["message"] = 0
+        try:
+            await self.database.add_record(guild_id, entry["steam_id"], item)
+        except ValueError:
+            raise CommandInputError("Record is already present.")
+        message_body = MC.basic("Done!")
+        await self.respond(ctx, **message_body)
+
+    @commands.command(name="stats")
+    @commands.guild_only()
+    async def stats(self, ctx, chart=""):
+        """Display guild analytics"""
+
+        await self.level_checker(5, ctx)
+        guild_id = str(ctx.guild.id)
+        if not self.database.check_guild(guild_id):
+            raise CommandInputError("Missing guild.")
+        analytics = self.database.analytics
+        if not analytics.is_available:
+            raise CommandInputError("Analytics are unavailable.")
+        columns = analytics.get(guild_id, self.database.state["guilds"][guild_id]["data"])
+        stats = columns.stats()
+        message_body = MC.stats(stats)
+        if chart.lower() == "chart":
+            buffer = analytics.chart(stats)
+            if buffer:
+                message_body["embed"].set_image(url="attachment://stats.png")
+                message_body["file"] = File(buffer, filename="stats.png")
+        await self.respond(ctx, timer=60, **message_body)
 
     @commands.command(name="set-channel")
     @commands.guild_only()
@@ -290,12 +769,15 @@ class Tracker(commands.Cog):
                 await self.database.set_channel(guild_id, channel_id)
             message_body = MC.basic("Done!")
             await self.respond(ctx, **message_body)
+        except CommandInputError:
+            raise
         except:
             pass
-        try:
-            await self.set_status_done()
-        except:
-            pass
+        finally:
+            try:
+                await self.set_status_done()
+            except:
+                pass
 
     @commands.command(name="set-private")
     @commands.guild_only()
@@ -310,12 +792,15 @@ class Tracker(commands.Cog):
             await self.database.set_private(guild_id, True)
             message_body = MC.basic("Done!")
             await self.respond(ctx, **message_body)
+        except CommandInputError:
+            raise
         except:
             pass
-        try:
-            await self.set_status_done()
-        except:
-            pass
+        finally:
+            try:
+                await self.set_status_done()
+            except:
+                pass
 
     @commands.command(name="set-public")
     @commands.guild_only()
@@ -330,12 +815,30 @@ class Tracker(commands.Cog):
             await self.database.set_private(guild_id, False)
             message_body = MC.basic("Done!")
             await self.respond(ctx, **message_body)
+        except CommandInputError:
+            raise
         except:
             pass
-        try:
-            await self.set_status_done()
-        except:
-            pass
+        finally:
+            try:
+                await self.set_status_done()
+            except:
+                pass
+
+    @commands.command(name="set-digest")
+    @commands.guild_only()
+    async def set_digest(self, ctx, minutes):
+        """Set digest window"""
+
+        await self.level_checker(5, ctx)
+        guild_id = str(ctx.guild.id)
+        if not self.database.check_guild(guild_id):
+            raise CommandInputError("Missing guild.")
+        if not minutes.isnumeric():
+            raise CommandInputError("Minutes should be an integer.")
+        self.database.set_digest(guild_id, int(minutes))
+        message_body = MC.basic("Done!")
+        await self.respond(ctx, **message_body)
 
     @commands.command(name="set-permissions")
     @commands.guild_only()
@@ -387,3 +890,81 @@ class Tracker(commands.Cog):
 
         message_body = MC.helper(await self.get_level(ctx))
         await self.respond(ctx, timer=60, **message_body)
+
+    async def invoke(self, ctx, command, *args, guild_only=True, **kvargs):
+        if guild_only and ctx.guild is None:
+            raise CommandInputError("This command is only available in servers.")
+        await ctx.defer(ephemeral=True)
+        await command(ctx, *args, **kvargs)
+
+    @slash_command(name="check", description="Check if users are blocked")
+    async def check_slash(self, ctx, profiles: Option(str, "Profile links or IDs separated by spaces")):
+        if not profiles.split():
+            raise CommandInputError("Missing arguments.")
+        await self.invoke(ctx, self.check, *profiles.split())
+
+    @slash_command(name="history", description="Display name history")
+    async def history_slash(self, ctx, profile: Option(str, "Profile link or ID")):
+        await self.invoke(ctx, self.history, profile)
+
+    @slash_command(name="block", description="Block user")
+    async def block_slash(self, ctx, profile: Option(str, "Profile link or ID")):
+        await self.invoke(ctx, self.block, profile)
+
+    @slash_command(name="edit", description="Edit user record")
+    async def edit_slash(self, ctx, profile: Option(str, "Profile link or ID"),
+                         args: Option(str, "k1:v1;k2:v2;...", required=False, default="")):
+        await self.invoke(ctx, self.edit, profile, args=args)
+
+    @slash_command(name="restore", description="Restore missing messages now")
+    async def restore_slash(self, ctx):
+        await self.invoke(ctx, self.restore)
+
+    @slash_command(name="import", description="Import records from csv/json file")
+    async def import_slash(self, ctx, file: Option(Attachment, "CSV or JSON file")):
+        await self.invoke(ctx, self.import_attachment, file)
+
+    @slash_command(name="export", description="Export records to file")
+    async def export_slash(self, ctx, fmt: Option(str, "File format", choices=["csv", "json"], default="csv")):
+        await self.invoke(ctx, self.export_records, fmt)
+
+    @slash_command(name="unblocked", description="Page through deleted records")
+    async def unblocked_slash(self, ctx, page: Option(int, "Page", min_value=1, default=1)):
+        await self.invoke(ctx, self.unblocked, str(page))
+
+    @slash_command(name="recover", description="Restore deleted record")
+    async def recover_slash(self, ctx, number: Option(int, "Entry number", min_value=1)):
+        await self.invoke(ctx, self.recover, str(number))
+
+    @slash_command(name="stats", description="Display guild analytics")
+    async def stats_slash(self, ctx, chart: Option(bool, "Attach chart", default=False)):
+        await self.invoke(ctx, self.stats, "chart" if chart else "")
+
+    @slash_command(name="set-channel", description="Define target channel")
+    async def set_channel_slash(self, ctx, channel: Option(str, "Channel name")):
+        await self.invoke(ctx, self.set_channel, channel)
+
+    @slash_command(name="set-private", description="Set to private mode")
+    async def set_private_slash(self, ctx):
+        await self.invoke(ctx, self.set_private)
+
+    @slash_command(name="set-public", description="Set to public mode")
+    async def set_public_slash(self, ctx):
+        await self.invoke(ctx, self.set_public)
+
+    @slash_command(name="set-digest", description="Set digest window")
+    async def set_digest_slash(self, ctx, minutes: Option(int, "Minutes, 0 to disable", min_value=0)):
+        await self.invoke(ctx, self.set_digest, str(minutes))
+
+    @slash_command(name="set-permissions", description="Set command permissions")
+    async def set_permissions_slash(self, ctx, level: Option(int, "Level", min_value=0, max_value=5),
+                                    roles: Option(str, "r1;r2;...")):
+        await self.invoke(ctx, self.set_permissions, str(level), roles=roles)
+
+    @slash_command(name="get-permissions", description="Display command permissions")
+    async def get_permissions_slash(self, ctx):
+        await self.invoke(ctx, self.get_permissions)
+
+    @slash_command(name="help", description="Send help message")
+    async def help_slash(self, ctx):
+        await self.invoke(ctx, self.help, guild_only=False)
@@ -1,4 +1,5 @@
 from asyncio import Lock
+from time import monotonic
 import warnings
 
 from discord import NotFound, Forbidden
@@ -8,8 +9,10 @@ from core.utils import Placeholder
 
 
 class Accountant:
-    def __init__(self, bot, channel_id, steam_id, item, is_private, counter):
+    def __init__(self, bot, guild_id, channel_id, steam_id, item, is_private, counter, waiter=None,
+                 indexer=None):
         self.bot = bot
+        self.guild_id = guild_id
         self.channel_id = channel_id
         self.is_private = is_private
 
@@ -20,7 +23,18 @@ class Accountant:
         self.message = None
         self.lock = Lock()
         self.counter = counter
+        self.waiter = waiter
+        self.indexer = indexer
         self.is_waiting = False
+        self.is_deleted = False
+        self.checked = None
+
+    @property
+    def jump_url(self):
+        if not self.item["message"]:
+            return None
+        return "https://discord.com/channels/{}/{}/{}".format(self.guild_id, self.channel_id,
+                                                              self.item["message"])
 
     async def _setup(self):
         channel = self.bot.get_channel(self.channel_id)
@@ -35,6 +49,23 @@ class Accountant:
         self.channel = channel
         self.is_waiting = False
 
+    async def attach(self, channel, message):
+        async with self.lock:
+            if self.is_deleted or not isinstance(self.channel, Placeholder):
+                return
+            self.channel = channel
+            self.message = message
+            if message is None:
+                self.item["message"] = 0
+            else:
+                self.checked = monotonic()
+            self.is_waiting = False
+
+    def wait(self):
+        self.is_waiting = True
+        if self.waiter:
+            self.waiter(self.steam_id)
+
     async def check_missing(self):
         async with self.lock:
             if self.message or self.is_waiting or isinstance(self.channel, Placeholder):
@@ -43,20 +74,24 @@ class Accountant:
 
     async def check_message(self):
         async with self.lock:
+            if self.is_deleted:
+                return
             if isinstance(self.channel, Placeholder):
                 await self._setup()
                 if self.message:
                     return self.message.jump_url
+            elif self.channel is None:
+                self.channel = self.bot.get_channel(self.channel_id)
             try:
                 self.message = await self.channel.fetch_message(self.item["message"])
             except (AttributeError, NotFound, Forbidden) as e:
                 if isinstance(e, Forbidden):
                     warnings.warn("Not allowed to read messages."
                                   "Could not verify existence!")
-                    self.is_waiting = True
+                    self.wait()
                     return
                 elif isinstance(e, AttributeError):
-                    self.is_waiting = False
+                    self.wait()
                     return
                 elif isinstance(e, NotFound):
                     self.item["message"] = 0
@@ -65,6 +100,7 @@ class Accountant:
                     raise e
             else:
                 self.is_waiting = False
+                self.checked = monotonic()
                 return self.message.jump_url
             i = self.counter()
             message_body = MC.card(self.steam_id, self.item,
@@ -76,18 +112,27 @@ class Accountant:
                     warnings.warn("Not allowed to send messages."
                                   "Could not send new!")
                 self.message = None
-                self.is_waiting = True
+                self.wait()
             else:
                 self.item["message"] = self.message.id
                 self.is_waiting = False
+                self.checked = monotonic()
                 return self.message.jump_url
 
+    def update(self, item):
+        last_date = self.item["last_date"]
+        for k in item:
+            self.item[k] = item[k]
+        if self.indexer and self.item["last_date"] != last_date:
+            self.indexer(self.steam_id, last_date, self.item["last_date"])
+
     async def set_item(self, item):
         async with self.lock:
+            if self.is_deleted:
+                return
             if isinstance(self.channel, Placeholder):
                 await self._setup()
-            for k in item:
-                self.item[k] = item[k]
+            self.update(item)
             try:
                 await self.message.delete()
             except (AttributeError, NotFound) as e:
@@ -97,8 +142,34 @@ class Accountant:
             self.is_waiting = True
         await self.check_message()
 
+    async def edit_item(self, item):
+        async with self.lock:
+            if self.is_deleted:
+                return
+            if isinstance(self.channel, Placeholder):
+                await self._setup()
+            self.update(item)
+            try:
+                footer = self.message.embeds[0].footer.text
+                i = int(footer.split("\n")[-1].split(" - ")[0])
+            except (AttributeError, IndexError, TypeError, ValueError):
+                i = None
+            if i is not None:
+                message_body = MC.card(self.steam_id, self.item,
+                                       self.is_private, i)
+                try:
+                    await self.message.edit(**message_body)
+                except (NotFound, Forbidden) as e:
+                    if isinstance(e, NotFound):
+                        self.item["message"] = 0
+                else:
+                    return self.jump_url
+        return await self.set_item({})
+
     async def set_channel(self, channel_id):
         async with self.lock:
+            if self.is_deleted:
+                return
             if isinstance(self.channel, Placeholder):
                 await self._setup()
             self.channel_id = channel_id
@@ -114,7 +185,7 @@ class Accountant:
 
     async def set_private(self, is_private):
         async with self.lock:
-            if self.is_private == is_private:
+            if self.is_deleted or self.is_private == is_private:
                 return
             if isinstance(self.channel, Placeholder):
                 await self._setup()
@@ -130,6 +201,7 @@ class Accountant:
 
     async def delete_item(self):
         async with self.lock:
+            self.is_deleted = True
             if isinstance(self.channel, Placeholder):
                 await self._setup()
             try:
@@ -0,0 +1,140 @@
+from datetime import date
+from io import BytesIO
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+try:
+    import matplotlib
+    matplotlib.use("Agg")
+    from matplotlib import pyplot
+except ImportError:
+    pyplot = None
+
+from core.utils import REASONS
+
+EPOCH = date(1970, 1, 1).toordinal()
+
+
+class Columns:
+    def __init__(self, capacity=64):
+        self.size = 0
+        self.rows = {}
+        self.ids = []
+        self.initiators = []
+        self.initiator_ids = {}
+        self.reasons = np.zeros(capacity, np.uint8)
+        self.encounters = np.zeros(capacity, np.int32)
+        self.date = np.zeros(capacity, np.int32)
+        self.last_date = np.zeros(capacity, np.int32)
+        self.initiator = np.zeros(capacity, np.int32)
+
+    def grow(self):
+        for name in ["reasons", "encounters", "date", "last_date", "initiator"]:
+            column = getattr(self, name)
+            grown = np.zeros(len(column) * 2, column.dtype)
+            grown[:len(column)] = column
+            setattr(self, name, grown)
+
+    def set(self, steam_id, item):
+        row = self.rows.get(steam_id)
+        if row is None:
+            if self.size == len(self.reasons):
+                self.grow()
+            row = self.size
+            self.size += 1
+            self.rows[steam_id] = row
+            self.ids.append(steam_id)
+        mask = 0
+        for i, (reason, _) in enumerate(REASONS):
+            if reason in item["reasons"]:
+                mask |= 1 << i
+        if item["initiator"] not in self.initiator_ids:
+            self.initiator_ids[item["initiator"]] = len(self.initiators)
+            self.initiators.append(item["initiator"])
+        self.reasons[row] = mask
+        self.encounters[row] = item["encounters"]
+        self.date[row] = item["date"]
+        self.last_date[row] = item["last_date"]
+        self.initiator[row] = self.initiator_ids[item["initiator"]]
+
+    def remove(self, steam_id):
+        row = self.rows.pop(steam_id, None)
+        if row is None:
+            return
+        last = self.size - 1
+        if row != last:
+            moved = self.ids[last]
+            self.ids[row] = moved
+            self.rows[moved] = row
+            for column in [self.reasons, self.encounters, self.date, self.last_date, self.initiator]:
+                column[row] = column[last]
+        self.ids.pop()
+        self.size = last
+
+    def stats(self, months=12, top=5):
+        n = self.size
+        reasons = self.reasons[:n]
+        encounters = self.encounters[:n]
+        stats = {"records": n,
+                 "encounters": int(encounters.sum()),
+                 "repeated": int(np.count_nonzero(encounters > 1)),
+                 "reasons": [(reason, int(np.count_nonzero(reasons & (1 << i))))
+                             for i, (reason, _) in enumerate(REASONS)]}
+        histogram = np.bincount(np.clip(encounters, 0, 10), minlength=11)
+        stats["histogram"] = [(str(i) if i < 10 else "10+", int(histogram[i]))
+                              for i in range(1, 11) if histogram[i]]
+        dates = (self.date[:n] - EPOCH).astype("datetime64[D]").astype("datetime64[M]")
+        keys, counts = np.unique(dates, return_counts=True)
+        stats["months"] = [(str(k), int(c)) for k, c in zip(keys[-months:], counts[-months:])]
+        counts = np.bincount(self.initiator[:n], minlength=len(self.initiators))
+        order = np.argsort(counts)[::-1][:top]
+        stats["initiators"] = [(self.initiators[i], int(counts[i])) for i in order if counts[i]]
+        return stats
+
+
+class Analytics:
+    def __init__(self):
+        self.columns = {}
+
+    @property
+    def is_available(self):
+        return np is not None
+
+    def build(self, guild_id, data):
+        columns = Columns(max(64, len(data)))
+        for steam_id, item in data.items():
+            columns.set(steam_id, item)
+        self.columns[guild_id] = columns
+        return columns
+
+    def get(self, guild_id, data):
+        if guild_id in self.columns:
+            return self.columns[guild_id]
+        return self.build(guild_id, data)
+
+    def update(self, guild_id, steam_id, item):
+        if guild_id in self.columns:
+            self.columns[guild_id].set(steam_id, item)
+
+    def remove(self, guild_id, steam_id):
+        if guild_id in self.columns:
+            self.columns[guild_id].remove(steam_id)
+
+    @staticmethod
+    def chart(stats):
+        if pyplot is None or not stats["months"]:
+            return None
+        figure, axes = pyplot.subplots(figsize=(8, 3))
+        labels, counts = zip(*stats["months"])
+        axes.bar(labels, counts, color="#6817ff")
+        axes.set_title("Blocks per month")
+        axes.tick_params(axis="x", labelrotation=45)
+        figure.tight_layout()
+        buffer = BytesIO()
+        figure.savefig(buffer, format="png")
+        pyplot.close(figure)
+        buffer.seek(0)
+        return buffer
@@ -0,0 +1,125 @@
+from datetime import datetime, timezone, timedelta
+import os
+import orjson
+
+
+class Archive:
+    def __init__(self, shard):
+        self.tzinfo = timezone(timedelta(hours=3))
+        self.shard = shard
+        self.index = {}
+        epoch = self._epoch()
+        for shard_id in self.shard.shard_ids:
+            self._migrate(shard_id, epoch)
+            self._scan(shard_id)
+
+    def path(self, guild_id):
+        return self.shard.path("unblocked", self.shard.of(guild_id), "jsonl")
+
+    def _epoch(self):
+        layout = str(self.shard.shard_count or 0)
+        try:
+            with open("data/unblocked.layout") as f:
+                count, epoch = f.read().split()
+        except (FileNotFoundError, ValueError):
+            count, epoch = None, "0"
+        if count != layout:
+            epoch = str(int(epoch) + 1)
+            with open("data/unblocked.layout", "w") as f:
+                f.write(f"{layout} {epoch}")
+        return epoch
+
+    def _migrate(self, shard_id, epoch):
+        path = self.shard.path("unblocked", shard_id, "jsonl")
+        legacy = self.shard.path("unblocked", shard_id)
+        if self._prepend([legacy], path, lambda guild_id: True):
+            os.replace(legacy, legacy + ".migrated")
+        marker = path + ".split"
+        try:
+            with open(marker) as f:
+                if f.read() == epoch:
+                    return
+        except FileNotFoundError:
+            pass
+        sources = sorted(f"data/{x}" for x in os.listdir("data")
+                         if x.startswith("unblocked") and x.endswith((".json", ".jsonl")))
+        self._prepend([x for x in sources if x != path], path,
+                      lambda guild_id: self.shard.of(guild_id) == shard_id)
+        with open(marker, "w") as f:
+            f.write(epoch)
+
+    def _prepend(self, sources, path, owns):
+        lines = []
+        found = False
+        for source in sources:
+            try:
+                with open(source, "rb") as f:
+                    data = f.read()
+            except FileNotFoundError:
+                continue
+            found = True
+            if source.endswith(".jsonl"):
+                lines.extend(line + b"\n" for line in data.splitlines()
+                             if line and owns(orjson.loads(line)["guild"]))
+                continue
+            lines.extend(orjson.dumps({"guild": guild_id, "author": author, "time": None,
+                                       "steam_id": steam_id, "item": item}) + b"\n"
+                         for guild_id, entries in orjson.loads(data).items() if owns(guild_id)
+                         for author, steam_id, item in entries)
+        if not found:
+            return False
+        try:
+            with open(path, "rb") as f:
+                existing = f.read()
+        except FileNotFoundError:
+            existing = b""
+        seen = set(existing.splitlines(keepends=True))
+        lines = [x for x in dict.fromkeys(lines) if x not in seen]
+        with open(path + ".tmp", "wb") as f:
+            f.write(b"".join(lines) + existing)
+        os.replace(path + ".tmp", path)
+        return True
+
+    def _scan(self, shard_id):
+        try:
+            with open(self.shard.path("unblocked", shard_id, "jsonl"), "rb") as f:
+                offset = 0
+                for line in f:
+                    entry = orjson.loads(line)
+                    if self.shard.of(entry["guild"]) == shard_id:
+                        self.index.setdefault(entry["guild"], []).append(offset)
+                    offset += len(line)
+        except FileNotFoundError:
+            pass
+
+    def append(self, guild_id, author, steam_id, item):
+        time = datetime.now(self.tzinfo).strftime("%Y-%m-%d-%H:%M:%S")
+        line = orjson.dumps({"guild": guild_id, "author": author, "time": time,
+                             "steam_id": steam_id, "item": item}) + b"\n"
+        with open(self.path(guild_id), "ab") as f:
+            offset = f.seek(0, os.SEEK_END)
+            f.write(line)
+        self.index.setdefault(guild_id, []).append(offset)
+
+    def count(self, guild_id):
+        return len(self.index.get(guild_id, []))
+
+    def get(self, guild_id, number):
+        offsets = self.index.get(guild_id, [])
+        if not 1 <= number <= len(offsets):
+            raise ValueError("Missing entry.")
+        with open(self.path(guild_id), "rb") as f:
+            f.seek(offsets[number - 1])
+            return orjson.loads(f.readline())
+
+    def page(self, guild_id, page, size=10):
+        offsets = self.index.get(guild_id, [])
+        last = len(offsets) - (page - 1) * size
+        entries = []
+        if last <= 0:
+            return entries
+        with open(self.path(guild_id), "rb") as f:
+            for number in range(last, max(last - size, 0), -1):
+                f.seek(offsets[number - 1])
+                entries.append((number, orjson.loads(f.readline())))
+        return entries
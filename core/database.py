@@ -1,43 +1,160 @@
-from asyncio import Lock
-from copy import deepcopy
+from asyncio import gather, sleep, Lock, Semaphore
+from bisect import bisect_left
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timezone, timedelta
+import os
+from time import monotonic, time
+from types import MappingProxyType
 import orjson
 
+from discord import Forbidden, HTTPException
+
 from core.accountant import Accountant
+from core.analytics import Analytics
+from core.archive import Archive
+from core.message_constructor import MessageConstructor as MC
+from core.names import NameHistory
+from core.poller import SUMMARY_KEYS
+from core.sharding import Shard
+from core.utils import Placeholder, parse_date
+
+NAME_WINDOW = 6
+
+
+def freeze(item):
+    item["old_names"] = tuple(item["old_names"])
+    item["reasons"] = tuple(item["reasons"])
+    for key in ["date", "last_date"]:
+        if isinstance(item[key], str):
+            item[key] = parse_date(item[key]) if item[key] else 0
+    return item
 
 
 class Database:
-    def __init__(self, bot):
+    def __init__(self, bot, shard=None):
         self.tzinfo = timezone(timedelta(hours=3))
         self.bot = bot
+        self.shard = shard or Shard()
         self.accountants = {}
-        self.state = {}
+        self.state = {"time": None, "guilds": {}}
         self.locks = {}
-        try:
-            with open("data/state.json", "rb") as f:
-                self.state = orjson.loads(f.read())
-        except FileNotFoundError:
-            self.state = {"time": None, "guilds": {}}
+        self.order = {}
+        self.poller = None
+        self.pending = {}
+        self.retries = {}
+        self.digests = {}
+        self.archive = Archive(self.shard)
+        self.analytics = Analytics()
+        path = self.shard.path("names", self.shard.shard_ids[0])
+        self.names = NameHistory(path, sources=[
+            f"data/{x}" for x in os.listdir("data")
+            if x.startswith(("names.", "names-")) and x.endswith(".json") and f"data/{x}" != path])
+        self.dirty = set()
+        if not self.load_state():
+            self.load_legacy_state()
+            self.dirty.update(self.state["guilds"].keys())
         for guild_id, guild_data in self.state["guilds"].items():
             self.accountants[guild_id] = {}
             self.locks[guild_id] = Lock()
             channel_id = guild_data["channel"]
             is_private = guild_data["private"]
             for steam_id, item in guild_data["data"].items():
-                accountant = Accountant(self.bot, channel_id, steam_id,
-                                        item, is_private, self.make_counter(guild_id))
+                self.record_names(steam_id, freeze(item))
+                accountant = Accountant(self.bot, guild_id, channel_id, steam_id,
+                                        item, is_private, self.make_counter(guild_id),
+                                        self.make_waiter(guild_id), self.make_indexer(guild_id))
                 self.accountants[guild_id][steam_id] = accountant
+            self.order[guild_id] = sorted((item["last_date"], steam_id)
+                                          for steam_id, item in guild_data["data"].items())
+
+    def load_state(self):
+        try:
+            names = os.listdir("data/state")
+        except FileNotFoundError:
+            return False
+        manifests = [x for x in names if x.startswith("manifest") and x.endswith(".json")]
+        if not manifests:
+            return False
+        for name in manifests:
+            with open(f"data/state/{name}", "rb") as f:
+                manifest = orjson.loads(f.read())
+            self.state["time"] = max(self.state["time"] or "", manifest["time"] or "") or None
+        guild_ids = [x[:-len(".json")] for x in names
+                     if x.endswith(".json") and x[:-len(".json")].isdigit()
+                     and self.shard.owns(x[:-len(".json")])]
+
+        def load(guild_id):
+            with open(f"data/state/{guild_id}.json", "rb") as f:
+                return orjson.loads(f.read())
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            for guild_id, guild_data in zip(guild_ids, executor.map(load, guild_ids)):
+                self.state["guilds"][guild_id] = guild_data
+        return True
+
+    def load_legacy_state(self):
+        found = False
+        for shard_id in self.shard.shard_ids:
+            try:
+                with open(self.shard.path("state", shard_id), "rb") as f:
+                    state = orjson.loads(f.read())
+            except FileNotFoundError:
+                continue
+            found = True
+            self.state["time"] = state["time"]
+            self.state["guilds"].update(state["guilds"])
+        if not found and self.shard.is_sharded:
+            try:
+                with open("data/state.json", "rb") as f:
+                    state = orjson.loads(f.read())
+            except FileNotFoundError:
+                pass
+            else:
+                self.state["time"] = state["time"]
+                self.state["guilds"] = {k: v for k, v in state["guilds"].items()
+                                        if self.shard.owns(k)}
+
+    def partition_state(self):
+        partitions = {shard_id: {"time": self.state["time"], "guilds": {}}
+                      for shard_id in self.shard.shard_ids}
+        for guild_id, guild_data in self.state["guilds"].items():
+            if self.shard.owns(guild_id):
+                partitions[self.shard.of(guild_id)]["guilds"][guild_id] = guild_data
+        return partitions
+
+    def record_names(self, steam_id, item):
+        if not self.names.check(steam_id):
+            for name in item["old_names"]:
+                self.names.add(steam_id, name)
+        item["old_names"] = item["old_names"][-NAME_WINDOW:]
+        return item
 
     def save_state(self):
+        self.names.save()
         self.state["time"] = datetime.now(
             self.tzinfo).strftime("%Y-%m-%d-%H:%M:%S")
-        with open("data/state.json", "wb") as f:
-            f.write(orjson.dumps(self.state))
+        os.makedirs("data/state", exist_ok=True)
+        dirty = self.dirty
+        self.dirty = set()
+        for guild_id in dirty:
+            if not self.check_guild(guild_id):
+                continue
+            path = f"data/state/{guild_id}.json"
+            with open(path + ".tmp", "wb") as f:
+                f.write(orjson.dumps(self.state["guilds"][guild_id]))
+            os.replace(path + ".tmp", path)
+        for shard_id, state in self.partition_state().items():
+            manifest = {"time": self.state["time"], "guilds": list(state["guilds"].keys())}
+            path = self.shard.path("state/manifest", shard_id)
+            with open(path + ".tmp", "wb") as f:
+                f.write(orjson.dumps(manifest))
+            os.replace(path + ".tmp", path)
 
     def backup_state(self):
         time = datetime.now(self.tzinfo).strftime("%Y-%m-%d-%H_%M_%S")
-        with open(f"backups/{time}.json", "wb") as f:
-            f.write(orjson.dumps(self.state))
+        for shard_id, state in self.partition_state().items():
+            suffix = f"-{shard_id}" if self.shard.is_sharded else ""
+            with open(f"backups/{time}{suffix}.json", "wb") as f:
+                f.write(orjson.dumps(state))
 
     def check_guild(self, guild_id):
         return guild_id in self.state["guilds"]
@@ -47,9 +164,45 @@ class Database:
             if not self.check_guild(guild_id):
                 raise ValueError("Missing guild.")
             self.state["guilds"][guild_id]["counter"] += 1
+            self.dirty.add(guild_id)
             return self.state["guilds"][guild_id]["counter"]
         return f
 
+    def make_waiter(self, guild_id, delay=60, max_delay=3 * 3600):
+        def f(steam_id):
+            retries = self.retries.setdefault(guild_id, {})
+            if steam_id in retries:
+                retries[steam_id][1] = min(retries[steam_id][1] * 2, max_delay)
+            else:
+                retries[steam_id] = [0, delay]
+            retries[steam_id][0] = monotonic() + retries[steam_id][1]
+        return f
+
+    def make_indexer(self, guild_id):
+        def f(steam_id, old_date, new_date):
+            self.unindex_record(guild_id, steam_id, old_date)
+            self.index_record(guild_id, steam_id, new_date)
+        return f
+
+    async def retry_waiting(self):
+        now = monotonic()
+        for guild_id, retries in list(self.retries.items()):
+            for steam_id, (due, _) in list(retries.items()):
+                if due > now:
+                    continue
+                accountant = self.accountants.get(guild_id, {}).get(steam_id)
+                if accountant and not accountant.is_deleted:
+                    await accountant.check_message()
+                    if accountant.is_waiting:
+                        continue
+                retries.pop(steam_id, None)
+            if not retries:
+                self.retries.pop(guild_id, None)
+
+    def retry_now(self, guild_id):
+        for entry in self.retries.get(guild_id, {}).values():
+            entry[0] = 0
+
     def add_guild(self, guild_id, channel_id):
         if self.check_guild(guild_id):
             raise ValueError("Guild is already present.")
@@ -57,13 +210,30 @@ class Database:
                                           "counter": 0, "data": {}}
         self.accountants[guild_id] = {}
         self.locks[guild_id] = Lock()
+        self.order[guild_id] = []
+        self.dirty.add(guild_id)
+
+    def index_record(self, guild_id, steam_id, last_date):
+        order = self.order[guild_id]
+        i = bisect_left(order, (last_date, steam_id))
+        if i == len(order) or order[i] != (last_date, steam_id):
+            order.insert(i, (last_date, steam_id))
+
+    def unindex_record(self, guild_id, steam_id, last_date):
+        order = self.order[guild_id]
+        i = bisect_left(order, (last_date, steam_id))
+        if i < len(order) and order[i] == (last_date, steam_id):
+            del order[i]
 
     async def set_channel(self, guild_id, channel_id):
         async with self.locks[guild_id]:
             if not self.check_guild(guild_id):
                 raise ValueError("Missing guild.")
             self.state["guilds"][guild_id]["channel"] = channel_id
-            for accountant in self.accountants[guild_id]:
+            self.dirty.add(guild_id)
+        for steam_id in list(self.accountants[guild_id].keys()):
+            accountant = self.accountants[guild_id].get(steam_id)
+            if accountant:
                 await accountant.set_channel(channel_id)
 
     async def set_private(self, guild_id, is_private):
@@ -73,13 +243,11 @@ class Database:
             if self.state["guilds"][guild_id]["private"] == is_private:
                 return
             self.state["guilds"][guild_id]["private"] = is_private
-            order = sorted([(datetime.strptime(self.state["guilds"][guild_id]["data"][x]["last_date"], "%d/%m/%Y"), x)
-                            for x in self.accountants[guild_id].keys()])
-            for _, steam_id in order:
-                try:
-                    await self.accountants[guild_id][steam_id].set_private(is_private)
-                except KeyError:
-                    pass
+            self.dirty.add(guild_id)
+        for _, steam_id in list(self.order[guild_id]):
+            accountant = self.accountants[guild_id].get(steam_id)
+            if accountant:
+                await accountant.set_private(is_private)
 
     def check_record(self, guild_id, steam_id):
         if not self.check_guild(guild_id):
@@ -92,83 +260,228 @@ class Database:
                 raise ValueError("Missing guild.")
             if self.check_record(guild_id, steam_id):
                 raise ValueError("Record is already present.")
-            self.state["guilds"][guild_id]["data"][steam_id] = item
+            self.state["guilds"][guild_id]["data"][steam_id] = self.record_names(steam_id, freeze(item))
+            self.dirty.add(guild_id)
             channel_id = self.state["guilds"][guild_id]["channel"]
             is_private = self.state["guilds"][guild_id]["private"]
-            accountant = Accountant(self.bot, channel_id, steam_id,
-                                    item, is_private, self.make_counter(guild_id))
-            await accountant.check_message()
+            accountant = Accountant(self.bot, guild_id, channel_id, steam_id,
+                                    item, is_private, self.make_counter(guild_id),
+                                    self.make_waiter(guild_id), self.make_indexer(guild_id))
             self.accountants[guild_id][steam_id] = accountant
+            self.index_record(guild_id, steam_id, item["last_date"])
+            self.analytics.update(guild_id, steam_id, item)
+            if self.poller:
+                self.poller.track(guild_id, steam_id, item)
+        await accountant.check_message()
 
-    async def update_record(self, guild_id, steam_id, item):
+    async def add_records(self, guild_id, items):
         async with self.locks[guild_id]:
-            if not self.check_record(guild_id, steam_id):
-                raise ValueError("Missing record.")
-            return await self.accountants[guild_id][steam_id].set_item(item)
+            if not self.check_guild(guild_id):
+                raise ValueError("Missing guild.")
+            channel_id = self.state["guilds"][guild_id]["channel"]
+            is_private = self.state["guilds"][guild_id]["private"]
+            self.dirty.add(guild_id)
+            added = []
+            for steam_id, item in items.items():
+                if self.check_record(guild_id, steam_id):
+                    continue
+                self.state["guilds"][guild_id]["data"][steam_id] = self.record_names(steam_id, freeze(item))
+                accountant = Accountant(self.bot, guild_id, channel_id, steam_id,
+                                        item, is_private, self.make_counter(guild_id),
+                                        self.make_waiter(guild_id), self.make_indexer(guild_id))
+                self.accountants[guild_id][steam_id] = accountant
+                self.index_record(guild_id, steam_id, item["last_date"])
+                self.analytics.update(guild_id, steam_id, item)
+                if self.poller:
+                    self.poller.track(guild_id, steam_id, item)
+                added.append(steam_id)
+            return added
+
+    async def update_record(self, guild_id, steam_id, item, in_place=False):
+        if not self.check_record(guild_id, steam_id):
+            raise ValueError("Missing record.")
+        accountant = self.accountants[guild_id][steam_id]
+        self.dirty.add(guild_id)
+        if in_place:
+            result = await accountant.edit_item(item)
+        else:
+            result = await accountant.set_item(item)
+        if not accountant.is_deleted:
+            self.analytics.update(guild_id, steam_id, accountant.item)
+            if self.poller:
+                self.poller.track(guild_id, steam_id, accountant.item)
+        return result
 
     def get_record(self, guild_id, steam_id):
         if not self.check_record(guild_id, steam_id):
             raise ValueError("Missing record.")
-        return deepcopy(self.state["guilds"][guild_id]["data"][steam_id])
+        return MappingProxyType(dict(self.state["guilds"][guild_id]["data"][steam_id]))
+
+    def find_id(self, guild_id, arg):
+        if not self.check_guild(guild_id):
+            raise ValueError("Missing guild.")
+        name = arg.strip().rstrip("/").split("/")[-1].lower()
+        for steam_id, item in self.state["guilds"][guild_id]["data"].items():
+            if steam_id == name or item["url"].rstrip("/").split("/")[-1].lower() == name:
+                return steam_id
 
     def get_ids(self, guild_id):
         if not self.check_guild(guild_id):
             raise ValueError("Missing guild.")
         return list(self.state["guilds"][guild_id]["data"].keys())
 
-    async def compare_records(self, guild_id, response):
+    def check_changed(self, guild_id, steam_id, item):
+        current_item = self.state["guilds"][guild_id]["data"][steam_id]
+        return any(item[k] != current_item[k] for k in SUMMARY_KEYS)
+
+    async def apply_changes(self, guild_id, changes):
         if not self.check_guild(guild_id):
             raise ValueError("Missing guild.")
-        for steam_id, item in response.items():
-            if item is None:
+        window = self.state["guilds"][guild_id].get("digest", 0)
+        for steam_id, item in changes.items():
+            if not self.check_record(guild_id, steam_id):
                 continue
-            changed = False
             current_item = self.state["guilds"][guild_id]["data"][steam_id]
             if item["name"] != current_item["name"]:
-                changed = True
-                item["old_names"] = current_item["old_names"] + [item["name"], ]
-            if item["url"] != current_item["url"]:
-                changed = True
-            if item["avatar"] != current_item["avatar"]:
-                changed = True
-            if await self.accountants[guild_id][steam_id].check_missing():
-                changed = True
-            if changed:
+                self.names.add(steam_id, item["name"], int(time()))
+            if window:
+                digest = self.digests.setdefault(guild_id, {"since": monotonic(), "changes": {}})
+                old = {k: current_item[k] for k in SUMMARY_KEYS}
+                digest["changes"].setdefault(steam_id, [old, None])[1] = item
+                if not await self.accountants[guild_id][steam_id].check_missing():
+                    continue
+            if item["name"] != current_item["name"]:
+                item = dict(item, old_names=(current_item["old_names"] + (item["name"], ))[-NAME_WINDOW:])
+            await self.update_record(guild_id, steam_id, item)
+
+    async def compare_records(self, guild_id, response):
+        if not self.check_guild(guild_id):
+            raise ValueError("Missing guild.")
+        changes = {}
+        for steam_id, item in response.items():
+            if item is None or not self.check_record(guild_id, steam_id):
+                continue
+            if self.check_changed(guild_id, steam_id, item):
+                changes[steam_id] = item
+            elif await self.accountants[guild_id][steam_id].check_missing():
                 await self.update_record(guild_id, steam_id, item)
+        await self.apply_changes(guild_id, changes)
 
-    async def get_message(self, guild_id, steam_id):
-        async with self.locks[guild_id]:
-            if not self.check_record(guild_id, steam_id):
-                raise ValueError("Missing record.")
-            return await self.accountants[guild_id][steam_id].check_message()
+    def set_digest(self, guild_id, minutes):
+        if not self.check_guild(guild_id):
+            raise ValueError("Missing guild.")
+        self.state["guilds"][guild_id]["digest"] = minutes
+        self.dirty.add(guild_id)
 
-    async def check_messages(self, guild_id):
-        async with self.locks[guild_id]:
-            if not self.check_guild(guild_id):
-                raise ValueError("Missing guild.")
-            order = sorted([(datetime.strptime(self.state["guilds"][guild_id]["data"][x]["last_date"], "%d/%m/%Y"), x)
-                            for x in self.accountants[guild_id].keys()])
-            for _, steam_id in order:
+    async def flush_digests(self, pace=1):
+        now = monotonic()
+        for guild_id, digest in list(self.digests.items()):
+            window = 0
+            if self.check_guild(guild_id):
+                window = self.state["guilds"][guild_id].get("digest", 0)
+            if window and now - digest["since"] < window * 60:
+                continue
+            del self.digests[guild_id]
+            lines = []
+            for steam_id, (old, item) in digest["changes"].items():
+                if not self.check_record(guild_id, steam_id):
+                    continue
+                current_item = self.state["guilds"][guild_id]["data"][steam_id]
+                if item["name"] != current_item["name"]:
+                    item["old_names"] = (current_item["old_names"] + (item["name"], ))[-NAME_WINDOW:]
+                await self.update_record(guild_id, steam_id, item, in_place=True)
+                lines.append((steam_id, old, item))
+                await sleep(pace)
+            if not lines:
+                continue
+            channel = self.bot.get_channel(self.state["guilds"][guild_id]["channel"])
+            try:
+                await channel.send(**MC.digest(lines))
+            except (AttributeError, Forbidden, HTTPException):
+                pass
+
+    async def repair_missing(self, guild_id):
+        if not self.check_guild(guild_id):
+            raise ValueError("Missing guild.")
+        for steam_id, accountant in list(self.accountants[guild_id].items()):
+            if await accountant.check_missing():
                 try:
-                    await self.accountants[guild_id][steam_id].check_message()
-                except KeyError:
+                    await self.update_record(guild_id, steam_id, {})
+                except ValueError:
                     pass
 
-    async def delete_record(self, guild_id, steam_id, ctx):
+    async def get_message(self, guild_id, steam_id):
+        if not self.check_record(guild_id, steam_id):
+            raise ValueError("Missing record.")
+        return await self.accountants[guild_id][steam_id].check_message()
+
+    async def warm_up(self, guild_id, concurrency=4):
+        if not self.check_guild(guild_id):
+            raise ValueError("Missing guild.")
+        accountants = [x for x in self.accountants[guild_id].values()
+                       if isinstance(x.channel, Placeholder)]
+        if not accountants:
+            return 0, 0
+        channel = self.bot.get_channel(self.state["guilds"][guild_id]["channel"])
+        wanted = {x.item["message"] for x in accountants if x.item["message"]}
+        found = {}
+        if channel is not None and wanted:
+            oldest = min(wanted)
+            try:
+                async for message in channel.history(limit=None):
+                    if message.id in wanted:
+                        found[message.id] = message
+                    if len(found) == len(wanted) or message.id <= oldest:
+                        break
+            except (Forbidden, HTTPException):
+                semaphore = Semaphore(concurrency)
+
+                async def check(accountant):
+                    async with semaphore:
+                        await accountant.check_message()
+                await gather(*[check(x) for x in accountants])
+                return len([x for x in accountants if x.message]), 0
+        for accountant in accountants:
+            await accountant.attach(channel, found.get(accountant.item["message"]))
+        return len(found), len(accountants) - len(found)
+
+    def get_url(self, guild_id, steam_id):
+        if not self.check_record(guild_id, steam_id):
+            raise ValueError("Missing record.")
+        self.pending[(guild_id, steam_id)] = None
+        return self.accountants[guild_id][steam_id].jump_url
+
+    async def verify_pending(self, limit=10, interval=600):
+        for _ in range(min(limit, len(self.pending))):
+            guild_id, steam_id = next(iter(self.pending))
+            del self.pending[(guild_id, steam_id)]
+            accountant = self.accountants.get(guild_id, {}).get(steam_id)
+            if not accountant:
+                continue
+            if accountant.checked and monotonic() - accountant.checked < interval:
+                continue
+            await accountant.check_message()
+
+    async def check_messages(self, guild_id):
+        if not self.check_guild(guild_id):
+            raise ValueError("Missing guild.")
+        for _, steam_id in list(self.order[guild_id]):
+            accountant = self.accountants[guild_id].get(steam_id)
+            if accountant:
+                await accountant.check_message()
+
+    async def delete_record(self, guild_id, steam_id, author):
         async with self.locks[guild_id]:
             if not self.check_record(guild_id, steam_id):
                 raise ValueError("Missing record.")
-            try:
-                with open("data/unblocked.json", "rb") as f:
-                    unblocked = orjson.loads(f.read())
-            except FileNotFoundError:
-                unblocked = {}
-            if guild_id not in unblocked:
-                unblocked[guild_id] = []
-            unblocked[guild_id].append(["{}#{}".format(ctx.author.name, ctx.author.discriminator),
-                                        steam_id, self.state["guilds"][guild_id]["data"][steam_id]])
-            with open("data/unblocked.json", "wb") as f:
-                f.write(orjson.dumps(unblocked))
+            self.archive.append(guild_id, "{}#{}".format(author.name, author.discriminator),
+                                steam_id, self.state["guilds"][guild_id]["data"][steam_id])
             await self.accountants[guild_id][steam_id].delete_item()
+            self.unindex_record(guild_id, steam_id,
+                                self.state["guilds"][guild_id]["data"][steam_id]["last_date"])
             del self.state["guilds"][guild_id]["data"][steam_id]
+            self.dirty.add(guild_id)
             del self.accountants[guild_id][steam_id]
+            self.analytics.remove(guild_id, steam_id)
+            if self.poller:
+                self.poller.untrack(guild_id, steam_id)
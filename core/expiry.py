@@ -0,0 +1,67 @@
+from time import time
+import orjson
+
+from discord import Forbidden, HTTPException, Object
+
+
+class Expiry:
+    def __init__(self, bot, path="data/expiry.json"):
+        self.bot = bot
+        self.path = path
+        self.wheel = {}
+        self.is_dirty = False
+        try:
+            with open(self.path, "rb") as f:
+                pending = orjson.loads(f.read())
+        except FileNotFoundError:
+            pending = []
+        for slot, channel_id, message_id in pending:
+            self.wheel.setdefault(slot, {}).setdefault(channel_id, set()).add(message_id)
+
+    def add(self, message, delay):
+        slot = int(time()) + delay
+        self.wheel.setdefault(slot, {}).setdefault(message.channel.id, set()).add(message.id)
+        self.is_dirty = True
+
+    def save(self):
+        pending = [[slot, channel_id, message_id]
+                   for slot, channels in self.wheel.items()
+                   for channel_id, message_ids in channels.items()
+                   for message_id in message_ids]
+        with open(self.path, "wb") as f:
+            f.write(orjson.dumps(pending))
+        self.is_dirty = False
+
+    async def tick(self):
+        now = int(time())
+        due = {}
+        for slot in [x for x in self.wheel if x <= now]:
+            for channel_id, message_ids in self.wheel.pop(slot).items():
+                due.setdefault(channel_id, set()).update(message_ids)
+            self.is_dirty = True
+        for channel_id, message_ids in due.items():
+            try:
+                await self.delete(channel_id, sorted(message_ids))
+            except:
+                pass
+        if self.is_dirty:
+            self.save()
+
+    async def delete(self, channel_id, message_ids):
+        channel = self.bot.get_channel(channel_id)
+        if channel is None:
+            return
+        bulk = hasattr(channel, "delete_messages")
+        for i in range(0, len(message_ids), 100):
+            chunk = message_ids[i:i + 100]
+            if bulk and len(chunk) > 1:
+                try:
+                    await channel.delete_messages([Object(id=x) for x in chunk])
+                    continue
+                except (Forbidden, HTTPException):
+                    pass
+            for message_id in chunk:
+                try:
+                    await channel.get_partial_message(message_id).delete()
+                except HTTPException:
+                    pass
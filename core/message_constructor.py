@@ -3,7 +3,7 @@ from datetime import datetime, timezone, timedelta
 from discord import Embed
 from discord.ui import Button, View
 
-from core.utils import BlockView, EditView, REASONS, COLORS, escape_characters
+from core.utils import BlockView, EditView, REASONS, COLORS, escape_characters, format_date, today
 
 
 class MessageConstructor:
@@ -17,18 +17,30 @@ class MessageConstructor:
         embed = Embed(title=f"**{text}**", color=0xff3f3f)
         return {"embed": embed}
 
+    @staticmethod
+    def mark_stale(message_body):
+        embed = message_body["embed"]
+        footer = "Steam is unavailable. Data may be stale."
+        if embed.footer.text:
+            footer = "{}\n{}".format(embed.footer.text, footer)
+        embed.set_footer(text=footer)
+        return message_body
+
     @staticmethod
     def helper(level):
         embed = Embed(title="**Commands:**",
                       color=0x99d959)
+        embed.set_footer(text="Every command is also available as a /slash command with private replies.")
         embed.add_field(name="LVL0: Send this message",
                         value="`?help`", inline=False)
         if level == 0:
             return {"embed": embed}
         embed.add_field(name="LVL1: Check if profile is listed",
-                        value="`?check {link/id}`", inline=False)
+                        value="`?check {link/id} {link/id} ...`", inline=False)
         if level == 1:
             return {"embed": embed}
+        embed.add_field(name="LVL1: Display name history",
+                        value="`?history {link/id}`", inline=False)
         embed.add_field(name="LVL2: Add profile to the list",
                         value="`?block {link/id}`", inline=False)
         if level == 2:
@@ -49,10 +61,22 @@ class MessageConstructor:
                         value="`?set-private`", inline=False)
         embed.add_field(name="LVL5: Set to the public mode (without initiator field)",
                         value="`?set-public`", inline=False)
+        embed.add_field(name="LVL5: Collect profile changes into digests (0 to disable)",
+                        value="`?set-digest {minutes}`", inline=False)
         embed.add_field(name="LVL5: Set command permissions",
                         value="`?set-permissions {level} {r1;r2;...}`", inline=False)
         embed.add_field(name="LVL5: Display command permissions",
                         value="`?get-permissions`", inline=False)
+        embed.add_field(name="LVL5: Import records from attached csv/json file",
+                        value="`?import`", inline=False)
+        embed.add_field(name="LVL5: Export records to file",
+                        value="`?export {csv/json}`", inline=False)
+        embed.add_field(name="LVL5: Display guild statistics",
+                        value="`?stats {chart}`", inline=False)
+        embed.add_field(name="LVL5: Page through deleted records",
+                        value="`?unblocked {page}`", inline=False)
+        embed.add_field(name="LVL5: Restore deleted record",
+                        value="`?recover {entry number}`", inline=False)
         return {"embed": embed}
 
     @staticmethod
@@ -64,6 +88,31 @@ class MessageConstructor:
                             value=", ".join(permissions[i]) or "**-**")
         return {"embed": embed}
 
+    @staticmethod
+    def stalls(lag, offenders):
+        embed = Embed(title="**Event loop stalls:**",
+                      description=f"Current lag: {lag * 1000:.0f}ms",
+                      color=0x99d959)
+        for location, (count, total, worst) in offenders:
+            embed.add_field(name=escape_characters(location), inline=False,
+                            value=f"worst {worst:.3f}s, total {total:.3f}s, {count} time{'s' * int(count > 1)}")
+        return {"embed": embed}
+
+    @staticmethod
+    def unblocked(entries, page, pages):
+        embed = Embed(title=f"**Deleted records ({page}/{pages}):**",
+                      color=0x99d959)
+        for number, entry in entries:
+            item = entry["item"]
+            embed.add_field(name="#{} {}".format(number, escape_characters(item["name"])), inline=False,
+                            value="SteamID: {}\n{}\nDeleted by {}{}".format(
+                                entry["steam_id"], ", ".join(item["reasons"]) or "**-**",
+                                escape_characters(entry["author"]),
+                                " at " + entry["time"] if entry["time"] else ""))
+        if not entries:
+            embed.description = "**-**"
+        return {"embed": embed}
+
     @staticmethod
     def check(message_url):
         embed = Embed(title=f"**User is tracked!**", color=0x99d959)
@@ -71,6 +120,53 @@ class MessageConstructor:
         view = View(button)
         return {"embed": embed, "view": view}
 
+    @staticmethod
+    def check_many(results):
+        hits = sum(state == "tracked" for _, state, _ in results)
+        embed = Embed(title=f"**{hits} of {len(results)} users are tracked!**",
+                      color=0x99d959)
+        buttons = []
+        for profile, state, message_url in results:
+            if state == "tracked":
+                value = "Tracked" if message_url else "Tracked. Could not resolve message."
+                if message_url:
+                    buttons.append(Button(label=profile[-80:], url=message_url))
+            elif state == "untracked":
+                value = "Not tracked"
+            else:
+                value = "Invalid profile"
+            embed.add_field(name=escape_characters(profile[-256:]),
+                            value=value, inline=False)
+        return {"embed": embed, "view": View(*buttons)}
+
+    @staticmethod
+    def history(steam_id, names):
+        tzinfo = timezone(timedelta(hours=3))
+        lines = []
+        for name, time in names[-25:][:: -1]:
+            line = "`{}`".format(name.replace("`", "'"))
+            if time:
+                line += " - " + datetime.fromtimestamp(time, tzinfo).strftime("%d/%m/%Y")
+            lines.append(line)
+        embed = Embed(title="**Name history:**", color=0x99d959,
+                      description="\n".join(lines) or "**-**")
+        embed.set_footer(text=f"SteamID: {steam_id}")
+        return {"embed": embed}
+
+    @staticmethod
+    def stats(stats):
+        embed = Embed(title="**Statistics:**", color=0x99d959,
+                      description="{} records, {} encounters, {} repeated".format(
+                          stats["records"], stats["encounters"], stats["repeated"]))
+        fields = [("Reasons", stats["reasons"]),
+                  ("Encounters", stats["histogram"]),
+                  ("Blocks per month", stats["months"]),
+                  ("Top initiators", stats["initiators"])]
+        for name, rows in fields:
+            value = "\n".join("{}: {}".format(escape_characters(str(k)), v) for k, v in rows)
+            embed.add_field(name=name, value=value or "**-**", inline=True)
+        return {"embed": embed}
+
     @staticmethod
     def block(database, guild_id, steam_id, ctx, item):
         embed = Embed(title=escape_characters(item["name"]),
@@ -79,11 +175,12 @@ class MessageConstructor:
         embed.set_thumbnail(url=item["avatar"])
         embed.set_footer(text="|{}|\nSteamID: {}".format("\u3000" * 35,
                                                          steam_id))
-        view = BlockView(database, guild_id, steam_id, ctx, item)
+        view = BlockView(database, guild_id, steam_id, ctx.author.id)
         return {"embed": embed, "view": view}
 
     @staticmethod
     def edit(database, guild_id, steam_id, ctx, rich, args):
+        view = EditView(database, guild_id, steam_id, ctx.author.id, rich)
         item = database.get_record(guild_id, steam_id)
         embed = Embed(title=escape_characters(item["name"]),
                       description=escape_characters(item["url"][27: -1]),
@@ -91,12 +188,37 @@ class MessageConstructor:
         embed.set_thumbnail(url=item["avatar"])
         for k in ["initiator", "encounters", "date", "last_date"]:
             if k in args:
-                embed.add_field(name=k, value=args[k], inline=False)
+                value = format_date(args[k]) if k in ["date", "last_date"] else args[k]
+                embed.add_field(name=k, value=value, inline=False)
         embed.set_footer(text="|{}|\nSteamID: {}".format("\u3000" * 35,
                                                          steam_id))
-        view = EditView(database, guild_id, steam_id, ctx, rich, args)
         return {"embed": embed, "view": view}
 
+    @staticmethod
+    def digest(changes):
+        lines = []
+        for steam_id, old, item in changes:
+            parts = []
+            if old["name"] != item["name"]:
+                parts.append("`{}` -> `{}`".format(old["name"].replace("`", "'"),
+                                                   item["name"].replace("`", "'")))
+            else:
+                parts.append("`{}`".format(item["name"].replace("`", "'")))
+            if old["avatar"] != item["avatar"]:
+                parts.append("avatar")
+            if old["url"] != item["url"]:
+                parts.append("url")
+            lines.append("{} ({})".format(", ".join(parts), steam_id))
+        description = ""
+        for i, line in enumerate(lines):
+            if len(description) + len(line) > 3900:
+                description += "...and {} more".format(len(lines) - i)
+                break
+            description += line + "\n"
+        embed = Embed(title=f"**{len(lines)} tracked profiles changed:**",
+                      description=description, color=0x6817ff)
+        return {"embed": embed}
+
     @staticmethod
     def card(steam_id, item, is_private, i):
         status = 0
@@ -115,12 +237,8 @@ class MessageConstructor:
         ending = "" if item["encounters"] == 1 else "s"
         last_date = ""
         if item["last_date"] != item["date"]:
-            last_date = "->" + item["last_date"]
-        ld = datetime.strptime(item["last_date"], "%d/%m/%Y")
-        tzinfo = timezone(timedelta(hours=3))
-        ld = ld.replace(tzinfo=tzinfo)
-        td = datetime.now(tzinfo)
-        d = (td - ld).days
+            last_date = "->" + format_date(item["last_date"])
+        d = today() - item["last_date"]
         latency = "(today)"
         if d:
             latency = " ({} day{} ago)".format(d, "s" * int(d > 1))
@@ -133,7 +251,7 @@ class MessageConstructor:
         embed.add_field(name="Last names",
                         value=old_names, inline=False)
         embed.add_field(name="{} encounter{} {}".format(item["encounters"], ending, latency),
-                        inline=is_private, value="{}{}".format(item["date"], last_date))
+                        inline=is_private, value="{}{}".format(format_date(item["date"]), last_date))
         if is_private:
             embed.add_field(name="Initiator", inline=is_private,
                             value=escape_characters(item["initiator"]))
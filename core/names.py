@@ -0,0 +1,133 @@
+import os
+import sys
+import orjson
+
+
+def read_history(path):
+    try:
+        with open(path, "rb") as f:
+            data = orjson.loads(f.read())
+    except FileNotFoundError:
+        return {}
+    history = {steam_id: [(data["names"][i], t) for i, t in entries]
+               for steam_id, entries in data["history"].items()}
+    try:
+        with open(f"{path[:-len('.json')]}.{data.get('generation', 0)}.log.jsonl", "rb") as f:
+            for line in f:
+                steam_id, name, time = orjson.loads(line)
+                history.setdefault(steam_id, []).append((name, time))
+    except FileNotFoundError:
+        pass
+    return history
+
+
+class NameHistory:
+    def __init__(self, path, limit=100, compact_every=10000, sources=()):
+        self.path = path
+        self.base = path[:-len(".json")]
+        self.archive_path = self.base + ".archive.jsonl"
+        self.limit = limit
+        self.compact_every = compact_every
+        self.names = []
+        self.ids = {}
+        self.history = {}
+        self.generation = 0
+        self.pending = []
+        self.logged = 0
+        try:
+            with open(self.path, "rb") as f:
+                data = orjson.loads(f.read())
+        except FileNotFoundError:
+            data = None
+        if data is not None:
+            for name in data["names"]:
+                self.intern(name)
+            self.history = data["history"]
+            self.generation = data.get("generation", 0)
+        try:
+            os.remove(self.log_path(self.generation - 1))
+        except FileNotFoundError:
+            pass
+        try:
+            with open(self.log_path(self.generation), "rb") as f:
+                for line in f:
+                    steam_id, name, time = orjson.loads(line)
+                    self.append(steam_id, name, time)
+                    self.logged += 1
+        except FileNotFoundError:
+            pass
+        for source in sources:
+            for steam_id, entries in read_history(source).items():
+                self.merge(steam_id, entries)
+
+    def log_path(self, generation):
+        return f"{self.base}.{generation}.log.jsonl"
+
+    def intern(self, name):
+        if name not in self.ids:
+            self.ids[name] = len(self.names)
+            self.names.append(sys.intern(name))
+        return self.ids[name]
+
+    def check(self, steam_id):
+        return steam_id in self.history
+
+    def append(self, steam_id, name, time):
+        entries = self.history.setdefault(steam_id, [])
+        i = self.intern(name)
+        if entries and entries[-1][0] == i:
+            return None
+        entries.append([i, time])
+        archived = entries[:-self.limit]
+        del entries[:-self.limit]
+        return archived
+
+    def add(self, steam_id, name, time=None):
+        archived = self.append(steam_id, name, time)
+        if archived is None:
+            return False
+        if archived:
+            with open(self.archive_path, "ab") as f:
+                f.write(orjson.dumps({"steam_id": steam_id,
+                                      "names": [[self.names[x], t] for x, t in archived]}) + b"\n")
+        self.pending.append((steam_id, name, time))
+        return True
+
+    def merge(self, steam_id, entries):
+        merged = []
+        for entry in sorted(dict.fromkeys(self.get(steam_id) + list(entries)),
+                            key=lambda x: -1 if x[1] is None else x[1]):
+            if not merged or merged[-1][0] != entry[0]:
+                merged.append(entry)
+        self.history[steam_id] = [[self.intern(name), t] for name, t in merged[-self.limit:]]
+
+    def get(self, steam_id):
+        return [(self.names[i], t) for i, t in self.history.get(steam_id, [])]
+
+    def compact(self):
+        used = {i for entries in self.history.values() for i, _ in entries}
+        if len(used) * 2 > len(self.names):
+            return
+        names = self.names
+        self.names = []
+        self.ids = {}
+        for entries in self.history.values():
+            for entry in entries:
+                entry[0] = self.intern(names[entry[0]])
+
+    def save(self):
+        if self.pending:
+            with open(self.log_path(self.generation), "ab") as f:
+                f.write(b"".join(orjson.dumps(x) + b"\n" for x in self.pending))
+            self.logged += len(self.pending)
+            self.pending = []
+        if self.logged < self.compact_every:
+            return
+        self.compact()
+        self.generation += 1
+        with open(self.path + ".tmp", "wb") as f:
+            f.write(orjson.dumps({"names": self.names, "history": self.history,
+                                  "generation": self.generation}))
+        os.replace(self.path + ".tmp", self.path)
+        os.remove(self.log_path(self.generation - 1))
+        self.logged = 0
@@ -0,0 +1,95 @@
+from multiprocessing import get_context
+from queue import Empty
+from time import monotonic
+
+from core.steam_api import SteamAPI
+
+SUMMARY_KEYS = ("name", "url", "avatar")
+
+
+def digest(item):
+    return tuple(item[k] for k in SUMMARY_KEYS)
+
+
+def run_poller(steam_key, steam_options, inbox, outbox, interval, probe_interval=30):
+    api = SteamAPI(steam_key, **steam_options)
+    digests = {}
+    current = -1
+    deadline = monotonic()
+    probed = 0
+    while True:
+        try:
+            message = inbox.get(timeout=max(0, deadline - monotonic()))
+        except Empty:
+            message = None
+        if message is not None:
+            if message[0] == "stop":
+                return
+            if message[0] == "track":
+                _, guild_id, steam_id, summary = message
+                digests.setdefault(guild_id, {})[steam_id] = summary
+            elif message[0] == "untrack":
+                _, guild_id, steam_id = message
+                digests.get(guild_id, {}).pop(steam_id, None)
+            continue
+        deadline = monotonic() + interval
+        if api.breaker.is_open:
+            if monotonic() - probed < probe_interval:
+                continue
+            probed = monotonic()
+            if not api.probe():
+                continue
+        guilds = [k for k, v in digests.items() if v]
+        if not guilds:
+            continue
+        current = (current + 1) % len(guilds)
+        guild_id = guilds[current]
+        guild_digests = digests[guild_id]
+        try:
+            response = api.get_summaries(list(guild_digests.keys()))
+        except:
+            continue
+        changes = {}
+        for steam_id, item in response.items():
+            if item is None or steam_id not in guild_digests:
+                continue
+            summary = digest(item)
+            if summary != guild_digests[steam_id]:
+                guild_digests[steam_id] = summary
+                changes[steam_id] = item
+        if changes:
+            outbox.put((guild_id, changes))
+
+
+class Poller:
+    def __init__(self, steam_key, steam_options=None, interval=30):
+        steam_options = dict(steam_options or {})
+        if steam_options.get("record"):
+            steam_options["record"] += ".poller"
+        context = get_context("spawn")
+        self.inbox = context.Queue()
+        self.outbox = context.Queue()
+        self.process = context.Process(target=run_poller, name="poller", daemon=True,
+                                       args=(steam_key, steam_options, self.inbox, self.outbox, interval))
+
+    def start(self):
+        if self.process.pid is None:
+            self.process.start()
+
+    def stop(self):
+        if self.process.is_alive():
+            self.inbox.put(("stop", ))
+            self.process.join(5)
+
+    def track(self, guild_id, steam_id, item):
+        self.inbox.put(("track", guild_id, steam_id, digest(item)))
+
+    def untrack(self, guild_id, steam_id):
+        self.inbox.put(("untrack", guild_id, steam_id))
+
+    def drain(self):
+        while True:
+            try:
+                yield self.outbox.get_nowait()
+            except Empty:
+                return
@@ -0,0 +1,18 @@
+from discord import Intents, MemberCacheFlags
+
+PROFILES = ["default", "lean"]
+
+
+def client_options(profile=None):
+    if profile in (None, "", "default"):
+        return {}
+    if profile != "lean":
+        raise ValueError(f"Unknown client profile: {profile}.")
+    intents = Intents.none()
+    intents.guilds = True
+    intents.guild_messages = True
+    intents.message_content = True
+    return {"intents": intents,
+            "member_cache_flags": MemberCacheFlags.none(),
+            "chunk_guilds_at_startup": False,
+            "max_messages": None}
@@ -0,0 +1,46 @@
+class Shard:
+    def __init__(self, shard_ids=None, shard_count=None):
+        self.shard_count = shard_count
+        if shard_count is None:
+            self.shard_ids = [0, ]
+        elif shard_ids is None:
+            self.shard_ids = list(range(shard_count))
+        else:
+            self.shard_ids = list(shard_ids)
+
+    @classmethod
+    def parse(cls, shard_ids, shard_count):
+        if not shard_count:
+            return cls()
+        shard_count = int(shard_count)
+        if not shard_ids:
+            return cls(None, shard_count)
+        ids = []
+        for part in shard_ids.split(","):
+            if "-" in part:
+                first, last = part.split("-")
+                ids.extend(range(int(first), int(last) + 1))
+            else:
+                ids.append(int(part))
+        return cls(ids, shard_count)
+
+    @property
+    def is_sharded(self):
+        return self.shard_count is not None
+
+    @property
+    def is_primary(self):
+        return 0 in self.shard_ids
+
+    def of(self, guild_id):
+        if not self.is_sharded:
+            return 0
+        return (int(guild_id) >> 22) % self.shard_count
+
+    def owns(self, guild_id):
+        return self.of(guild_id) in self.shard_ids
+
+    def path(self, name, shard_id, ext="json"):
+        if not self.is_sharded:
+            return f"data/{name}.{ext}"
+        return f"data/{name}-{shard_id}.{ext}"
@@ -1,9 +1,136 @@
+from collections import deque
+import gzip
+from threading import Lock
+from time import monotonic, sleep
+import orjson
+
 from steam.webapi import WebAPI
 
 
+class SteamUnavailable(Exception):
+    pass
+
+
+class CircuitBreaker:
+    def __init__(self, threshold=3):
+        self.threshold = threshold
+        self.failures = 0
+        self.opened = None
+
+    @property
+    def is_open(self):
+        return self.opened is not None
+
+    def success(self):
+        self.failures = 0
+        self.opened = None
+
+    def failure(self):
+        self.failures += 1
+        if self.failures >= self.threshold and self.opened is None:
+            self.opened = monotonic()
+
+
+class Recorder:
+    def __init__(self, path):
+        self.file = gzip.open(path, "ab")
+        self.start = monotonic()
+        self.lock = Lock()
+
+    def write(self, interface, params, response):
+        line = orjson.dumps({"t": round(monotonic() - self.start, 3), "i": interface,
+                             "p": params, "r": response}) + b"\n"
+        with self.lock:
+            self.file.write(line)
+            self.file.flush()
+
+
+def call_key(interface, params):
+    items = []
+    for k, v in sorted(params.items()):
+        if k == "steamids":
+            v = ",".join(sorted(str(v).split(",")))
+        items.append((k, str(v)))
+    return interface, tuple(items)
+
+
+class Replayer:
+    def __init__(self, path, speed=1.0):
+        self.speed = speed
+        self.calls = {}
+        self.remaining = 0
+        self.start = None
+        self.first = None
+        self.lock = Lock()
+        offset = 0
+        last = 0
+        with gzip.open(path, "rb") as f:
+            for line in f:
+                entry = orjson.loads(line)
+                if entry["t"] < last:
+                    offset += last
+                last = entry["t"]
+                if self.first is None:
+                    self.first = offset + entry["t"]
+                key = call_key(entry["i"], entry["p"])
+                self.calls.setdefault(key, deque()).append((offset + entry["t"], entry["r"]))
+                self.remaining += 1
+
+    def has(self, interface, **params):
+        return bool(self.calls.get(call_key(interface, params)))
+
+    def call(self, interface, **params):
+        with self.lock:
+            calls = self.calls.get(call_key(interface, params))
+            if not calls:
+                raise LookupError(f"No recorded response left for {interface} {params}.")
+            t, response = calls.popleft()
+            self.remaining -= 1
+            if self.start is None:
+                self.start = monotonic()
+        if self.speed:
+            delay = (t - self.first) / self.speed - (monotonic() - self.start)
+            if delay > 0:
+                sleep(delay)
+        return response
+
+
 class SteamAPI:
-    def __init__(self, key):
-        self.core = WebAPI(key)
+    def __init__(self, key, http_timeout=10, record=None, replay=None, speed=1.0):
+        if replay:
+            self.core = Replayer(replay, speed)
+        else:
+            self.core = WebAPI(key, http_timeout=http_timeout)
+        self.recorder = Recorder(record) if record else None
+        self.breaker = CircuitBreaker()
+
+    def call(self, interface, probe=False, **params):
+        if self.breaker.is_open and not probe:
+            raise SteamUnavailable("Steam is unavailable.")
+        try:
+            response = self.core.call(interface, **params)
+        except Exception as e:
+            self.breaker.failure()
+            raise SteamUnavailable("Steam is unavailable.") from e
+        self.breaker.success()
+        if self.recorder:
+            self.recorder.write(interface, params, response)
+        return response
+
+    def probe(self):
+        interface = "ISteamUserStats.GetNumberOfCurrentPlayers"
+        try:
+            self.call(interface, probe=True, appid=1418630)
+        except SteamUnavailable:
+            return False
+        return True
+
+    @staticmethod
+    def parse_id(arg):
+        arg = arg.strip().rstrip("/").split("/")
+        if len(arg) == 1 or arg[-2].lower() == "profiles":
+            if arg[-1].isdigit() and len(arg[-1]) == 17:
+                return arg[-1]
 
     def get_id(self, arg):
         if arg[-1] == "/":
@@ -13,21 +140,25 @@ class SteamAPI:
             return
         if len(arg) == 1 or arg[-2].lower() == "profiles":
             interface = "ISteamUser.GetPlayerSummaries"
-            response = self.core.call(interface, steamids=arg[-1])
+            response = self.call(interface, steamids=arg[-1])
             if len(response["response"]["players"]):
                 return response["response"]["players"][0]["steamid"]
         if len(arg) == 1 or arg[-2].lower() == "id":
             interface = "ISteamUser.ResolveVanityURL"
-            response = self.core.call(interface, vanityurl=arg[-1])
+            response = self.call(interface, vanityurl=arg[-1])
             if "steamid" in response["response"]:
                 return response["response"]["steamid"]
 
+    @staticmethod
+    def chunks(steam_ids, size=100):
+        for i in range(0, len(steam_ids), size):
+            yield ",".join(steam_ids[i:i + size])
+
     def get_summaries(self, steam_ids):
         mapping = dict.fromkeys(steam_ids)
         interface = "ISteamUser.GetPlayerSummaries"
-        for i in range((len(steam_ids) - 1) // 100 + 1):
-            chunk = steam_ids[i * 100:i * 100 + 100]
-            response = self.core.call(interface, steamids=",".join(chunk))
+        for chunk in self.chunks(steam_ids):
+            response = self.call(interface, steamids=chunk)
             for item in response["response"]["players"]:
                 if item["steamid"] in mapping:
                     mapping[item["steamid"]] = {"name": item["personaname"],
@@ -37,6 +168,6 @@ class SteamAPI:
 
     def get_player_count(self):
         interface = "ISteamUserStats.GetNumberOfCurrentPlayers"
-        response = self.core.call(interface, appid=1418630)
+        response = self.call(interface, appid=1418630)
         if response["response"]["result"] == 1:
             return response["response"]["player_count"]
@@ -0,0 +1,94 @@
+import csv
+from io import BytesIO, StringIO
+import orjson
+
+from core.utils import REASONS, CommandInputError, format_date, parse_date
+
+FIELDS = ["steam_id", "url", "name", "reasons", "initiator",
+          "encounters", "date", "last_date"]
+
+
+def parse_reasons(value):
+    if not isinstance(value, list):
+        value = str(value).split(";")
+    names = {reason.lower(): reason for reason, _ in REASONS}
+    reasons = []
+    for reason in value:
+        reason = str(reason).strip().lower()
+        if not reason:
+            continue
+        if reason not in names:
+            raise CommandInputError(f"Invalid reason: {reason}.")
+        if names[reason] not in reasons:
+            reasons.append(names[reason])
+    if not reasons:
+        raise CommandInputError("Every row needs at least one reason.")
+    return [reason for reason, _ in REASONS if reason in reasons]
+
+
+def parse_row(row):
+    if not isinstance(row, dict):
+        raise CommandInputError("Every row should be an object with named fields.")
+    profile = row.get("profile") or row.get("steam_id") or row.get("url")
+    if not profile:
+        raise CommandInputError("Every row needs a profile.")
+    parsed = {"profile": str(profile).strip(),
+              "reasons": parse_reasons(row.get("reasons", ""))}
+    if row.get("initiator"):
+        parsed["initiator"] = str(row["initiator"])
+    if row.get("encounters"):
+        if not str(row["encounters"]).isnumeric():
+            raise CommandInputError(
+                "Encounters parameter should be an integer.")
+        parsed["encounters"] = int(row["encounters"])
+    for key in ["date", "last_date"]:
+        if row.get(key):
+            try:
+                parsed[key] = parse_date(str(row[key]))
+            except ValueError:
+                raise CommandInputError(f"Invalid {key}: {row[key]}.")
+    return parsed
+
+
+def read_rows(filename, data):
+    try:
+        if filename.lower().endswith(".json"):
+            rows = orjson.loads(data)
+            if not isinstance(rows, list):
+                raise CommandInputError("JSON file should contain a list.")
+        elif filename.lower().endswith(".csv"):
+            rows = list(csv.DictReader(StringIO(data.decode("utf-8-sig"))))
+        else:
+            raise CommandInputError("Attach a .csv or .json file.")
+    except (orjson.JSONDecodeError, UnicodeDecodeError, csv.Error):
+        raise CommandInputError("Could not parse attached file.")
+    return [parse_row(row) for row in rows]
+
+
+def write_rows(fmt, records):
+    buffer = BytesIO()
+    if fmt == "json":
+        buffer.write(b"[")
+        for i, (steam_id, item) in enumerate(records):
+            if i:
+                buffer.write(b",")
+            row = {k: item[k] for k in FIELDS[1:]}
+            row["steam_id"] = steam_id
+            row["date"] = format_date(item["date"])
+            row["last_date"] = format_date(item["last_date"])
+            buffer.write(orjson.dumps(row))
+        buffer.write(b"]")
+    else:
+        text = StringIO()
+        writer = csv.writer(text)
+        writer.writerow(FIELDS)
+        for steam_id, item in records:
+            writer.writerow([steam_id, item["url"], item["name"], ";".join(item["reasons"]),
+                             item["initiator"], item["encounters"],
+                             format_date(item["date"]), format_date(item["last_date"])])
+            buffer.write(text.getvalue().encode())
+            text.seek(0)
+            text.truncate()
+        buffer.write(text.getvalue().encode())
+    buffer.seek(0)
+    return buffer
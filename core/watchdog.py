@@ -0,0 +1,93 @@
+from asyncio import sleep
+from datetime import datetime, timezone, timedelta
+import os
+import sys
+from threading import Event, Lock, Thread, get_ident
+from time import monotonic
+import traceback
+
+
+class Watchdog:
+    def __init__(self, threshold=0.25, interval=0.05, path="data/stalls.log"):
+        self.tzinfo = timezone(timedelta(hours=3))
+        self.threshold = threshold
+        self.interval = interval
+        self.path = path
+        self.root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+        self.lag = 0.0
+        self.heartbeat = None
+        self.loop_thread = None
+        self.stalled = None
+        self.offenders = {}
+        self.lock = Lock()
+        self.stopped = Event()
+        self.task = None
+        self.thread = None
+
+    def start(self, loop):
+        if self.task is not None:
+            return
+        self.loop_thread = get_ident()
+        self.heartbeat = monotonic()
+        self.stopped.clear()
+        self.task = loop.create_task(self._beat())
+        self.thread = Thread(target=self._watch, name="watchdog", daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.stopped.set()
+        if self.task is not None:
+            self.task.cancel()
+            self.task = None
+
+    async def _beat(self):
+        while True:
+            start = monotonic()
+            self.heartbeat = start
+            await sleep(self.interval)
+            self.lag = max(0.0, monotonic() - start - self.interval)
+
+    def _watch(self):
+        while not self.stopped.wait(self.interval):
+            heartbeat = self.heartbeat
+            lag = monotonic() - heartbeat - self.interval
+            if self.stalled is None:
+                if lag > self.threshold:
+                    self.stalled = (heartbeat, self._capture())
+            elif heartbeat != self.stalled[0]:
+                start, stack = self.stalled
+                self.stalled = None
+                self._record(heartbeat - start - self.interval, stack)
+
+    def _capture(self):
+        frame = sys._current_frames().get(self.loop_thread)
+        if frame is None:
+            return []
+        return traceback.extract_stack(frame)
+
+    def _attribute(self, stack):
+        for frame in reversed(stack):
+            if frame.filename.startswith(self.root):
+                return f"{os.path.relpath(frame.filename, self.root)}:{frame.lineno} {frame.name}"
+        if stack:
+            frame = stack[-1]
+            return f"{frame.filename}:{frame.lineno} {frame.name}"
+        return "unknown"
+
+    def _record(self, duration, stack):
+        location = self._attribute(stack)
+        with self.lock:
+            count, total, worst = self.offenders.get(location, (0, 0.0, 0.0))
+            self.offenders[location] = (count + 1, total + duration,
+                                        max(worst, duration))
+        time = datetime.now(self.tzinfo).strftime("%Y-%m-%d-%H:%M:%S")
+        with open(self.path, "a") as f:
+            f.write(f"{time} {duration:.3f}s {location}\n")
+            f.write("".join(traceback.format_list(stack[-8:])))
+
+    def report(self, limit=10):
+        with self.lock:
+            items = list(self.offenders.items())
+        items.sort(key=lambda x: x[1][2], reverse=True)
+        return items[:limit]
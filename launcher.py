@@ -0,0 +1,21 @@
+import os
+import subprocess
+import sys
+
+
+if __name__ == "__main__":
+    shard_count = int(sys.argv[1])
+    processes = int(sys.argv[2]) if len(sys.argv) > 2 else shard_count
+    size = (shard_count - 1) // processes + 1
+    children = []
+    for first in range(0, shard_count, size):
+        last = min(first + size, shard_count) - 1
+        env = dict(os.environ, SHARD_COUNT=str(shard_count),
+                   SHARD_IDS=f"{first}-{last}")
+        children.append(subprocess.Popen([sys.executable, "bot.py"], env=env))
+    try:
+        for child in children:
+            child.wait()
+    except KeyboardInterrupt:
+        for child in children:
+            child.terminate()
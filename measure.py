@@ -0,0 +1,74 @@
+from argparse import ArgumentParser, SUPPRESS
+import asyncio
+import os
+import resource
+import subprocess
+import sys
+from time import monotonic
+import orjson
+
+from discord.ext import commands
+from dotenv import load_dotenv
+
+from core.profiles import PROFILES, client_options
+from core.sharding import Shard
+
+
+def current_rss():
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1])
+    return 0
+
+
+def measure(profile, settle):
+    start = monotonic()
+    shard = Shard.parse(os.getenv("SHARD_IDS"), os.getenv("SHARD_COUNT"))
+    options = client_options(profile)
+    if shard.is_sharded:
+        bot = commands.AutoShardedBot(command_prefix=("~", "?"), help_command=None,
+                                      shard_ids=shard.shard_ids,
+                                      shard_count=shard.shard_count, **options)
+    else:
+        bot = commands.Bot(command_prefix=("~", "?"), help_command=None, **options)
+    result = {}
+
+    @bot.event
+    async def on_ready():
+        if result:
+            return
+        result["startup"] = monotonic() - start
+        await asyncio.sleep(settle)
+        result["guilds"] = len(bot.guilds)
+        result["members"] = sum(len(guild.members) for guild in bot.guilds)
+        result["messages"] = len(bot.cached_messages)
+        result["rss"] = current_rss()
+        result["peak"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        await bot.close()
+
+    bot.run(os.getenv("DISCORD_TOKEN"))
+    return dict(result, profile=profile)
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description="Report RSS and startup time for each client profile.")
+    parser.add_argument("profiles", nargs="*", default=PROFILES)
+    parser.add_argument("--settle", type=float, default=30,
+                        help="seconds to stay connected after ready before sampling")
+    parser.add_argument("--child", action="store_true", help=SUPPRESS)
+    args = parser.parse_args()
+    load_dotenv()
+
+    if args.child:
+        sys.stdout.buffer.write(orjson.dumps(measure(args.profiles[0], args.settle)) + b"\n")
+        sys.exit()
+
+    print(f"{'profile':<10}{'startup':>10}{'rss MB':>10}{'peak MB':>10}"
+          f"{'guilds':>8}{'members':>10}{'messages':>10}")
+    for profile in args.profiles:
+        output = subprocess.run([sys.executable, __file__, "--child", "--settle", str(args.settle), profile],
+                                capture_output=True, check=True).stdout
+        row = orjson.loads(output.splitlines()[-1])
+        print(f"{row['profile']:<10}{row['startup']:>9.1f}s{row['rss'] / 1024:>10.1f}"
+              f"{row['peak'] / 1024:>10.1f}{row['guilds']:>8}{row['members']:>10}{row['messages']:>10}")
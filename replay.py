@@ -0,0 +1,94 @@
+from argparse import ArgumentParser
+import asyncio
+import cProfile
+import os
+import pstats
+import shutil
+import tempfile
+from time import monotonic
+import orjson
+
+from core.database import Database
+from core.steam_api import SteamAPI, SteamUnavailable
+
+INTERFACE = "ISteamUser.GetPlayerSummaries"
+
+
+class OfflineBot:
+    def get_channel(self, channel_id):
+        return None
+
+
+async def replay(api, database, limit):
+    guilds = list(database.accountants.keys())
+    polls = 0
+    changes = 0
+    current = 0
+    start = monotonic()
+    while guilds and (not limit or polls < limit):
+        current %= len(guilds)
+        guild_id = guilds[current]
+        steam_ids = database.get_ids(guild_id)
+        if not all(api.core.has(INTERFACE, steamids=x) for x in SteamAPI.chunks(steam_ids)):
+            del guilds[current]
+            continue
+        current += 1
+        polls += 1
+        try:
+            response = api.get_summaries(steam_ids)
+        except SteamUnavailable:
+            break
+        changes += sum(1 for steam_id, item in response.items()
+                       if item and database.check_changed(guild_id, steam_id, item))
+        await database.compare_records(guild_id, response)
+    return polls, changes, monotonic() - start
+
+
+def copy_state(source, target):
+    shutil.copytree(source, target)
+    manifest = os.path.join(target, "manifest.json")
+    if os.path.exists(manifest):
+        return
+    merged = {"time": None, "guilds": []}
+    for name in sorted(os.listdir(target)):
+        if name.startswith("manifest-") and name.endswith(".json"):
+            with open(os.path.join(target, name), "rb") as f:
+                shard_manifest = orjson.loads(f.read())
+            merged["time"] = shard_manifest["time"]
+            merged["guilds"].extend(shard_manifest["guilds"])
+    with open(manifest, "wb") as f:
+        f.write(orjson.dumps(merged))
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description="Replay recorded Steam responses through the update pipeline.")
+    parser.add_argument("recording")
+    parser.add_argument("--state", default="data/state",
+                        help="state directory with its manifests, or a legacy state.json file")
+    parser.add_argument("--speed", type=float, default=0,
+                        help="replay speed multiplier, 0 replays without delays")
+    parser.add_argument("--limit", type=int, default=0)
+    parser.add_argument("--profile", action="store_true")
+    args = parser.parse_args()
+
+    recording = os.path.abspath(args.recording)
+    state = os.path.abspath(args.state)
+    workdir = tempfile.mkdtemp()
+    os.makedirs(os.path.join(workdir, "data"))
+    if os.path.isdir(state):
+        copy_state(state, os.path.join(workdir, "data", "state"))
+    else:
+        shutil.copy(state, os.path.join(workdir, "data", "state.json"))
+    os.chdir(workdir)
+
+    api = SteamAPI(None, replay=recording, speed=args.speed)
+    database = Database(OfflineBot())
+    profiler = cProfile.Profile() if args.profile else None
+    if profiler:
+        profiler.enable()
+    polls, changes, elapsed = asyncio.run(replay(api, database, args.limit))
+    if profiler:
+        profiler.disable()
+        pstats.Stats(profiler).sort_stats("cumulative").print_stats(30)
+    print(f"{polls} polls, {changes} changed records, {elapsed:.2f}s")
+    shutil.rmtree(workdir)